@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Fantasy Guild Manager
+Run from the project folder, e.g. ``python -m benchmarks.bench_formats``
+"""
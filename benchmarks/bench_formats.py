@@ -0,0 +1,57 @@
+"""
+Compare load/save time and file size of the data file formats
+
+Usage: python -m benchmarks.bench_formats [--members N] [--quests N] [--items N] [--compress gzip|xz]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from guild_storage import COMPRESSIONS, SNAPSHOT_FORMATS, dump_snapshot, load_snapshot, open_compressed
+from benchmarks.synthetic import generate_guild
+
+
+def bench_format(data, snapshot_format: str, path: str, repeat: int, compression: str = "none", level: int = None):
+    """Return the best save time, best load time and file size for one format"""
+    save_times = []
+    load_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open_compressed(path, 'wb', compression, level) as f:
+            dump_snapshot(data, f, snapshot_format)
+        save_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with open_compressed(path, 'rb', compression) as f:
+            load_snapshot(f)
+        load_times.append(time.perf_counter() - start)
+    return min(save_times), min(load_times), os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark guild data file formats")
+    parser.add_argument("--members", type=int, default=100000, help="Number of members")
+    parser.add_argument("--quests", type=int, default=10000, help="Number of quests")
+    parser.add_argument("--items", type=int, default=1000, help="Number of inventory items")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default="none", help="Compression to apply")
+    parser.add_argument("--compress-level", type=int, help="Compression level")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per format (best is reported)")
+    args = parser.parse_args()
+
+    data = generate_guild(args.members, args.quests, args.items)
+    print(f"Guild: {args.members} members, {args.quests} quests, {args.items} items, "
+          f"compression: {args.compress}")
+    print(f"{'format':<10} {'save (s)':>10} {'load (s)':>10} {'size (MB)':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for snapshot_format in SNAPSHOT_FORMATS:
+            save_time, load_time, size = bench_format(
+                data, snapshot_format, os.path.join(tmp, "guild." + snapshot_format), args.repeat,
+                args.compress, args.compress_level)
+            print(f"{snapshot_format:<10} {save_time:>10.3f} {load_time:>10.3f} {size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Time the main GuildManager operations and the web generator on a synthetic guild
+
+Reports seconds, throughput and peak traced memory (tracemalloc) per
+operation plus the data file size, as a table or as JSON. Save the JSON of
+one commit and pass it to --compare on another to see regressions.
+
+Usage: python -m benchmarks.bench_guild [--members N] [--quests N] [--items N] [--backend NAME]
+                                        [--json FILE] [--compare FILE] [--threshold PCT]
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from guild_manager import GuildManager
+from guild_storage import BACKENDS
+from web_generator import generate_guild_webpage
+from benchmarks.synthetic import write_guild
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPERATIONS = ["load_data", "save_data", "add_member", "list_members", "list_quests",
+              "update_resources", "generate_guild_webpage"]
+
+
+def storage_size(path: str) -> int:
+    """Bytes used by a data file, its split directory and its journal"""
+    total = 0
+    for candidate in (path, path + ".journal"):
+        if os.path.isfile(candidate):
+            total += os.path.getsize(candidate)
+    for folder, _, files in os.walk(path + ".d"):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total
+
+
+def measure(operation, repeat: int):
+    """Return the best time of operation() over repeat runs and the peak memory of one traced run"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def bench_operations(path: str, backend: str, members: int, quests: int, repeat: int):
+    """Run every operation against the guild at path and return their results"""
+    records = members + quests
+    recruits = itertools.count()
+    page = os.path.join(os.path.dirname(path), "guild_page.html")
+    results = {}
+    # GuildManager reports every step on stdout; keep that out of the timings' way
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        guild = GuildManager(path, backend)
+        operations = {
+            # name: (callable, units of work per call, unit)
+            "load_data": (lambda: GuildManager(path, backend), records, "records/s"),
+            "save_data": (guild.save_data, records, "records/s"),
+            "add_member": (lambda: guild.add_member(f"Bench Recruit {next(recruits)}", "Bard", 5,
+                                                    "Joined during a benchmark run."), 1, "ops/s"),
+            "list_members": (guild.list_members, members, "records/s"),
+            "list_quests": (guild.list_quests, quests, "records/s"),
+            "update_resources": (lambda: guild.update_resources(10, "Bench Potion", 1), 1, "ops/s"),
+            "generate_guild_webpage": (lambda: generate_guild_webpage(guild.data, page), records, "records/s"),
+        }
+        for name in OPERATIONS:
+            operation, work, unit = operations[name]
+            seconds, peak = measure(operation, repeat)
+            results[name] = {
+                "seconds": seconds,
+                "throughput": work / seconds if seconds else None,
+                "unit": unit,
+                "peak_memory_bytes": peak
+            }
+    return results
+
+
+def git_commit():
+    """The checked-out commit, if this is a git checkout"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold: float, out=sys.stdout) -> list:
+    """Print how each operation's time changed since baseline and return the regressions"""
+    if baseline.get("params") != report["params"]:
+        print(f"Warning: baseline was run with {baseline.get('params')}, not {report['params']}", file=out)
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:", file=out)
+    regressions = []
+    for name in OPERATIONS:
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = (report["results"][name]["seconds"] / old["seconds"] - 1) * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24} {old['seconds']:>10.4f} -> {report['results'][name]['seconds']:>10.4f} s "
+              f"{change:>+8.1f}%{flag}", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GuildManager operations on a synthetic guild")
+    parser.add_argument("--members", type=int, default=10000, help="Number of members (1000 to 1000000)")
+    parser.add_argument("--quests", type=int, default=1000, help="Number of quests")
+    parser.add_argument("--items", type=int, default=100, help="Number of inventory items")
+    parser.add_argument("--backend", choices=BACKENDS, default="json", help="Storage backend to benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic guild")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation (best is reported)")
+    parser.add_argument("--json", metavar="FILE", help="Write the results as JSON ('-' for stdout)")
+    parser.add_argument("--compare", metavar="FILE", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="Slowdown in percent that counts as a regression (default 10)")
+    args = parser.parse_args()
+
+    params = {"members": args.members, "quests": args.quests, "items": args.items,
+              "backend": args.backend, "seed": args.seed, "repeat": args.repeat}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "guild.db" if args.backend == "sqlite" else "guild_data.json")
+        write_guild(path, args.backend, members=args.members, quests=args.quests, items=args.items, seed=args.seed)
+        results = bench_operations(path, args.backend, args.members, args.quests, args.repeat)
+        file_size = storage_size(path)
+
+    report = {
+        "benchmark": "guild",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "file_size_bytes": file_size,
+        "results": results
+    }
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"Guild: {args.members} members, {args.quests} quests, {args.items} items, "
+              f"backend: {args.backend}, file size: {file_size / 1e6:.1f} MB")
+        print(f"{'operation':<24} {'time (s)':>10} {'throughput':>14} {'':<9} {'peak (MB)':>10}")
+        for name in OPERATIONS:
+            result = results[name]
+            print(f"{name:<24} {result['seconds']:>10.4f} {result['throughput'] or 0:>14,.0f} "
+                  f"{result['unit']:<9} {result['peak_memory_bytes'] / 1e6:>10.1f}")
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"[+] Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            out = sys.stderr if args.json == "-" else sys.stdout
+            regressions = compare(report, json.load(f), args.threshold, out)
+        if regressions:
+            print(f"[-] Slower than the baseline: {', '.join(regressions)}", file=out)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Measure cold-start time of guild_manager.py subcommands against a budget
+
+Each command is run in a fresh interpreter on a small guild, so the numbers
+are dominated by startup: interpreter launch, imports and argument parsing.
+The time over a bare ``python -c pass`` is checked against --budget-ms and
+the script exits with status 1 if any command goes over. Every subcommand of
+guild_manager.COMMANDS must have at least one entry in COMMANDS; the daemon
+is timed until it is ready to serve.
+
+Usage: python -m benchmarks.bench_startup [--repeat N] [--budget-ms MS] [--import-budget-ms MS] [--importtime]
+"""
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import guild_manager
+from guild_storage import dump_snapshot
+from benchmarks.synthetic import generate_guild
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANAGER = os.path.join(ROOT, "guild_manager.py")
+
+# name -> arguments after "guild_manager.py --data guild.json"
+COMMANDS = {
+    "help": ["--help"],
+    "member list": ["member", "list"],
+    "member add": ["member", "add", "Startup Tester", "Bard"],
+    "quest list": ["quest", "list"],
+    "quest archive": ["quest", "archive"],
+    "resource": ["resource", "--gold", "1"],
+    "resource report": ["resource", "report"],
+    "resource ledger": ["resource", "ledger", "--limit", "20"],
+    "announce": ["announce", "Startup check"],
+    "announce history": ["announce", "history", "--limit", "20"],
+    "info": ["info", "--name", "Startup Guild"],
+    "web": ["web", "--output", "page.html"],
+    "import": ["import", "items", "items.csv"],
+    "search": ["search", "startup"],
+    "export": ["export", "members", "--output", "members.csv"],
+    "batch": ["batch", "batch.txt"],
+    "serve-daemon": ["serve-daemon"],
+    "compact": ["compact"],
+    "convert": ["convert", "copy.db"],
+}
+
+# Commands that run until stopped; they are timed until their first line of output
+SERVED = {"serve-daemon"}
+
+# Input files the commands above read, written next to the guild
+INPUTS = {
+    "items.csv": "name,quantity\nStartup Potion,1\n",
+    "batch.txt": "member list\nresource --gold 1\nannounce Batch startup check\n",
+}
+
+
+def command_line(args, importtime: bool = False):
+    flags = ["-X", "importtime"] if importtime else []
+    if args is None:
+        return [sys.executable] + flags + ["-c", "pass"]
+    if args == "menu":
+        return [sys.executable] + flags + ["-c", "import guild_menu"]
+    return [sys.executable] + flags + [MANAGER, "--data", "guild.json", "--durability", "fast"] + args
+
+
+def run(args, cwd: str, env, importtime: bool = False):
+    """Run a command line to the end, or a served one until it is ready
+
+    Returns the seconds that took, and the command's stderr if importtime.
+    """
+    served = isinstance(args, list) and args[0] in SERVED
+    start = time.perf_counter()
+    process = subprocess.Popen(command_line(args, importtime), cwd=cwd, env=dict(env, PYTHONUNBUFFERED="1"),
+                               stdout=subprocess.PIPE if served else subprocess.DEVNULL,
+                               stderr=subprocess.PIPE if importtime else None, text=True)
+    if served:
+        process.stdout.readline()
+        elapsed = time.perf_counter() - start
+        process.send_signal(signal.SIGTERM)
+        _, stderr = process.communicate()
+    else:
+        _, stderr = process.communicate()
+        elapsed = time.perf_counter() - start
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    return elapsed, stderr
+
+
+def wall_time(args, cwd: str, env, repeat: int) -> float:
+    """Median wall time in milliseconds of running a command line (until ready, for a served one)"""
+    return statistics.median(run(args, cwd, env)[0] for _ in range(repeat)) * 1000
+
+
+def import_times(args, cwd: str, env):
+    """Return {module: cumulative ms} for the top-level imports of a command, from -X importtime"""
+    modules = {}
+    for line in run(args, cwd, env, importtime=True)[1].splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports are indented
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark guild_manager.py startup time")
+    parser.add_argument("--repeat", type=int, default=15, help="Runs per command (the median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=80,
+                        help="Allowed time per command on top of bare interpreter startup")
+    parser.add_argument("--import-budget-ms", type=float, default=40,
+                        help="Allowed import time per command, as measured by -X importtime")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports of each command")
+    args = parser.parse_args()
+
+    missing = set(guild_manager.COMMANDS) - {command[0] for command in COMMANDS.values()}
+    if missing:
+        parser.error(f"no startup benchmark for: {', '.join(sorted(missing))}")
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    commands = dict(COMMANDS, menu="menu")
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "guild.json"), 'wb') as f:
+            dump_snapshot(generate_guild(members=50, quests=10, items=10), f)
+        for name, text in INPUTS.items():
+            with open(os.path.join(tmp, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+
+        baseline = wall_time(None, tmp, env, args.repeat)
+        baseline_imports = set(import_times(None, tmp, env))
+        print(f"Bare interpreter: {baseline:.1f} ms (budget: +{args.budget_ms:g} ms, "
+              f"imports {args.import_budget_ms:g} ms)")
+        print(f"{'command':<16} {'wall (ms)':>10} {'over bare':>10} {'imports':>10}  slowest import")
+
+        for name, command in commands.items():
+            total = wall_time(command, tmp, env, args.repeat)
+            modules = {module: ms for module, ms in import_times(command, tmp, env).items()
+                       if module not in baseline_imports}
+            import_ms = sum(modules.values())
+            slowest = sorted(modules.items(), key=lambda entry: entry[1], reverse=True)
+            over = total - baseline
+            flag = ""
+            if over > args.budget_ms or import_ms > args.import_budget_ms:
+                failures.append(name)
+                flag = "  OVER BUDGET"
+            top = f"{slowest[0][0]} ({slowest[0][1]:.1f})" if slowest else "-"
+            print(f"{name:<16} {total:>10.1f} {over:>10.1f} {import_ms:>10.1f}  {top}{flag}")
+            if args.importtime:
+                for module, ms in slowest[:8]:
+                    print(f"{'':<16} {module:>32} {ms:>8.1f} ms")
+
+    if failures:
+        print(f"[-] Over budget: {', '.join(failures)}")
+        sys.exit(1)
+    print("[+] All commands within budget")
+
+
+if __name__ == "__main__":
+    main()
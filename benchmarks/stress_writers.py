@@ -0,0 +1,202 @@
+"""
+Stress-test concurrent writers on one data file
+
+Spawns N worker processes that each behave like a stream of separate CLI
+invocations: open the guild, make one random change (add or remove a
+member, complete a quest, add or spend gold), save. Afterwards the final
+guild is checked against what the workers did: gold must equal the start
+plus every delta, every added member must be there and every removed or
+completed one must stay that way. Reports lost updates, failed loads and
+p50/p99 latency per operation for each N.
+
+Usage: python -m benchmarks.stress_writers [--workers 1,2,4,8] [--ops N] [--backend NAME] [--json FILE]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from guild_manager import GuildManager
+from guild_storage import BACKENDS, DURABILITY_LEVELS
+from benchmarks.synthetic import write_guild
+
+CONFLICT_MESSAGE = "changed by another process"
+
+
+def percentile(values, fraction: float) -> float:
+    """The value below which the given fraction of values fall"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def worker(task):
+    """Run random operations as one writer and return what it did"""
+    worker_id, path, options, ops, quests, seed, start_at = task
+    rng = random.Random(seed * 1000 + worker_id)
+    done = {"gold": 0, "added": [], "removed": [], "completed": [], "latencies": [],
+            "load_errors": [], "conflicts": 0}
+    members = []
+    quests = list(quests)
+    time.sleep(max(0.0, start_at - time.time()))
+
+    for op in range(ops):
+        choices = ["add", "gold"] + (["remove"] if members else []) + (["complete"] if quests else [])
+        action = rng.choice(choices)
+        output = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                guild = GuildManager(path, **options)
+                if action == "add":
+                    name = f"Stress {worker_id} {op}"
+                    guild.add_member(name, "Fighter", rng.randint(1, 20))
+                    members.append(name)
+                    done["added"].append(name)
+                elif action == "remove":
+                    name = members.pop(rng.randrange(len(members)))
+                    guild.remove_member(name)
+                    done["added"].remove(name)
+                    done["removed"].append(name)
+                elif action == "complete":
+                    quest_id = quests.pop(rng.randrange(len(quests)))
+                    guild.complete_quest(guild.data["quests"][quest_id]["title"])
+                    done["completed"].append(quest_id)
+                else:
+                    delta = rng.randint(-50, 100)
+                    guild.update_resources(gold=delta)
+                    done["gold"] += delta
+        except Exception as e:
+            done["load_errors"].append(f"{action}: {e}")
+            continue
+        done["latencies"].append(time.perf_counter() - started)
+        done["conflicts"] += output.getvalue().count(CONFLICT_MESSAGE)
+    return done
+
+
+def run_round(workers: int, ops: int, backend: str, options, seed: int):
+    """Run one round with the given number of workers and check the result"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "guild.db" if backend == "sqlite" else "guild_data.json")
+        initial = write_guild(path, backend, members=100, quests=workers * ops, items=10, seed=seed)
+        available = [quest_id for quest_id, quest in initial["quests"].items() if quest["status"] == "available"]
+        # Each worker gets its own quests, so every completion should stick
+        shares = [available[index::workers] for index in range(workers)]
+
+        start_at = time.time() + 0.5
+        tasks = [(index, path, dict(options, backend=backend), ops, shares[index], seed, start_at)
+                 for index in range(workers)]
+        with multiprocessing.Pool(workers) as pool:
+            started = time.perf_counter()
+            results = pool.map(worker, tasks)
+            wall = time.perf_counter() - started - max(0.0, start_at - time.time())
+
+        load_errors = [error for result in results for error in result["load_errors"]]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                final = GuildManager(path, backend, **options).data
+        except Exception as e:
+            load_errors.append(f"final load: {e}")
+            final = None
+
+        latencies = [latency for result in results for latency in result["latencies"]]
+        expected_gold = initial["resources"]["gold"] + sum(result["gold"] for result in results)
+        report = {
+            "workers": workers,
+            "operations": len(latencies),
+            "wall_seconds": round(wall, 3),
+            "ops_per_second": round(len(latencies) / wall, 1) if wall > 0 else None,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+            "conflicts_reapplied": sum(result["conflicts"] for result in results),
+            "load_errors": load_errors,
+        }
+        if final is not None:
+            members = final["members"]
+            quests = final["quests"]
+            report.update({
+                "expected_gold": expected_gold,
+                "final_gold": final["resources"]["gold"],
+                "lost_gold": expected_gold - final["resources"]["gold"],
+                "lost_members": sum(1 for result in results for name in result["added"]
+                                    if name.lower().replace(" ", "_") not in members),
+                "resurrected_members": sum(1 for result in results for name in result["removed"]
+                                           if name.lower().replace(" ", "_") in members),
+                "lost_completions": sum(1 for result in results for quest_id in result["completed"]
+                                        if quests[quest_id]["status"] != "completed"),
+            })
+        return report
+
+
+def violations(report) -> list:
+    """The invariants a round broke"""
+    broken = [key for key in ("lost_gold", "lost_members", "resurrected_members", "lost_completions")
+              if report.get(key)]
+    if report["load_errors"]:
+        broken.append("load_errors")
+    if "final_gold" not in report:
+        broken.append("final guild unreadable")
+    return broken
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress-test concurrent writers on one guild data file")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts to run")
+    parser.add_argument("--ops", type=int, default=40, help="Operations per worker")
+    parser.add_argument("--backend", choices=BACKENDS, default="json", help="Storage backend")
+    parser.add_argument("--journal", action="store_true", help="Use journal mode (json backend)")
+    parser.add_argument("--durability", choices=DURABILITY_LEVELS, default="safe", help="Save durability")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", metavar="FILE", help="Also write the reports as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    options = {"durability": args.durability}
+    if args.journal:
+        options["journal"] = True
+
+    reports = []
+    out = sys.stderr if args.json == "-" else sys.stdout
+    print(f"Backend: {args.backend}{' (journal)' if args.journal else ''}, durability: {args.durability}, "
+          f"{args.ops} operations per worker", file=out)
+    print(f"{'workers':>7} {'ops':>6} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'reapplied':>9} "
+          f"{'lost gold':>9} {'lost mem':>8} {'lost done':>9} {'load err':>8}", file=out)
+    for workers in (int(count) for count in args.workers.split(",")):
+        report = run_round(workers, args.ops, args.backend, options, args.seed)
+        reports.append(report)
+        print(f"{workers:>7} {report['operations']:>6} {report['ops_per_second'] or 0:>8.1f} "
+              f"{report['p50_ms']:>8.2f} {report['p99_ms']:>8.2f} {report['conflicts_reapplied']:>9} "
+              f"{report.get('lost_gold', '?'):>9} {report.get('lost_members', '?'):>8} "
+              f"{report.get('lost_completions', '?'):>9} {len(report['load_errors']):>8}", file=out)
+        for error in report["load_errors"][:5]:
+            print(f"   {error}", file=out)
+
+    if args.json:
+        params = {"backend": args.backend, "journal": args.journal, "durability": args.durability,
+                  "ops": args.ops, "seed": args.seed}
+        if args.json == "-":
+            json.dump({"params": params, "rounds": reports}, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({"params": params, "rounds": reports}, f, indent=2)
+
+    broken = {report["workers"]: violations(report) for report in reports if violations(report)}
+    if broken:
+        for workers, names in broken.items():
+            print(f"[-] {workers} workers: {', '.join(names)}", file=out)
+        sys.exit(1)
+    print("[+] No lost updates or failed loads", file=out)
+
+
+if __name__ == "__main__":
+    main()
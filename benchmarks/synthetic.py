@@ -0,0 +1,110 @@
+"""
+Synthetic guild generator for benchmarks
+Builds large, realistic-looking guilds without touching any data file
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Any
+
+CLASSES = ["Wizard", "Fighter", "Rogue", "Cleric", "Ranger", "Paladin", "Bard", "Druid", "Warlock", "Monk"]
+DIFFICULTIES = ["Easy", "Normal", "Hard", "Legendary"]
+WORDS = (
+    "ancient arcane blade brave castle cavern dragon dungeon elven forest goblin guardian healer "
+    "hidden iron journey keep knight legend lost magic mountain mystic night oath orc path "
+    "portal quest raid realm relic ruins rune scout shadow shield silent spell storm sword "
+    "temple tower treasure troll valley vault warrior whispering wild wizard woods"
+).split()
+
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def generate_guild(members: int = 1000, quests: int = 100, items: int = 50, seed: int = 0,
+                   announcements: int = 10) -> Dict[str, Any]:
+    """Generate guild data in the same shape GuildManager stores it
+
+    The same sizes and seed always give the same guild, so benchmark runs on
+    different commits work on identical data.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+
+    def timestamp(index: int) -> str:
+        return (start + timedelta(minutes=index)).isoformat()
+
+    data = {
+        "guild_name": "The Benchmark Brigade",
+        "guild_description": "A very large band of adventurers",
+        "members": {},
+        "quests": {},
+        "resources": {"gold": rng.randint(0, 1000000), "items": {}},
+        "announcements": [],
+        "last_updated": timestamp(0)
+    }
+
+    for i in range(members):
+        name = f"Adventurer {i}"
+        data["members"][name.lower().replace(" ", "_")] = {
+            "name": name,
+            "class": rng.choice(CLASSES),
+            "level": rng.randint(1, 20),
+            "description": _sentence(rng, 4, 16),
+            "status": "active" if rng.random() < 0.9 else "inactive",
+            "joined_date": timestamp(i)
+        }
+
+    for i in range(quests):
+        title = f"Quest {i}"
+        quest = {
+            "title": title,
+            "description": _sentence(rng, 8, 30),
+            "reward": f"{rng.randint(10, 5000)} gold",
+            "difficulty": rng.choice(DIFFICULTIES),
+            "status": "available",
+            "created_date": timestamp(i)
+        }
+        if rng.random() < 0.5:
+            quest["status"] = "completed"
+            quest["completed_date"] = timestamp(i + 60)
+        data["quests"][title.lower().replace(" ", "_")] = quest
+
+    for i in range(items):
+        data["resources"]["items"][f"Item {i}"] = rng.randint(1, 100)
+
+    for i in range(announcements):
+        data["announcements"].append({"message": _sentence(rng, 6, 20), "date": timestamp(i)})
+
+    return data
+
+
+def write_guild(path: str, backend: str = None, **sizes) -> Dict[str, Any]:
+    """Generate a guild (see generate_guild for the sizes) and store it at path"""
+    from guild_storage import open_storage
+
+    data = generate_guild(**sizes)
+    open_storage(path, backend).replace(data)
+    return data
+
+
+def main():
+    import argparse
+    from guild_storage import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Write a synthetic guild to a data file")
+    parser.add_argument("output", help="Data file to create")
+    parser.add_argument("--backend", choices=BACKENDS, help="Storage backend (detected from the file name by default)")
+    parser.add_argument("--members", type=int, default=1000, help="Number of members")
+    parser.add_argument("--quests", type=int, default=100, help="Number of quests")
+    parser.add_argument("--items", type=int, default=50, help="Number of inventory items")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    write_guild(args.output, args.backend, members=args.members, quests=args.quests, items=args.items, seed=args.seed)
+    print(f"[+] Wrote {args.members} members, {args.quests} quests and {args.items} items to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
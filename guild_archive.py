@@ -0,0 +1,234 @@
+"""
+Archives for the Fantasy Guild Manager
+Append-only segment files holding history that no longer belongs in the
+main data file, with a small index of the time span each segment covers
+"""
+
+import gzip
+import json
+import os
+import re
+
+from guild_model import json_default
+from guild_storage import atomic_write
+from guild_timing import phase
+
+# Records per segment file before a new one is started
+SEGMENT_RECORDS = 1000
+
+# A date or date and time, as far as it goes: 2026, 2026-10-17, 2026-10-17T18:30, ...
+_TIME_BOUND = re.compile(r"\d{4}(-\d{2}(-\d{2}(T\d{2}(:\d{2}(:\d{2}(\.\d+)?)?)?)?)?)?")
+
+
+def check_time_bound(value: str) -> str:
+    """Normalize a --since/--until value (an ISO 8601 date or time, or a prefix of one)"""
+    normalized = value.strip().replace(" ", "T")
+    if not _TIME_BOUND.fullmatch(normalized):
+        raise ValueError(f"Not a date or time: {value!r} (use e.g. 2026-10-17 or 2026-10-17T18:30)")
+    return normalized
+
+
+def in_range(stamp: str, since: str = None, until: str = None) -> bool:
+    """Whether an ISO timestamp falls between since and until
+
+    Both ends are inclusive and may be prefixes, so until "2026-10-17" takes
+    in the whole day.
+    """
+    return (since is None or stamp >= since) and (until is None or stamp[:len(until)] <= until)
+
+
+class SegmentArchive:
+    """Time-ordered records appended to numbered segment files in a directory
+
+    Records go to the newest ("open") segment until it holds SEGMENT_RECORDS.
+    It is then sealed: gzipped, its first and last timestamps added to
+    ``index.json``, and the next segment is started. A range query reads the
+    index and only the sealed segments whose span overlaps the range, plus
+    the open segment, so its cost follows the range rather than the whole
+    history. Segments are never rewritten. How many records the open
+    segment holds is kept in ``open.json``, so appending never reads it.
+
+    With ``compress``, the open segment is gzipped too, and rewritten whole
+    (atomically) on each append; that suits archives appended to now and
+    then, such as archived quests, not one record per save.
+    """
+
+    def __init__(self, directory: str, time_field: str, durability: str = "safe",
+                 segment_records: int = SEGMENT_RECORDS, compress: bool = False):
+        self.directory = directory
+        self.time_field = time_field
+        self.durability = durability
+        self.segment_records = segment_records
+        self.compress = compress
+        self.index_file = os.path.join(directory, "index.json")
+        self.open_file = os.path.join(directory, "open.json")
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def _segment_file(self, number: int) -> str:
+        return os.path.join(self.directory, f"{number:06d}.jsonl")
+
+    def _open_segment_file(self, number: int) -> str:
+        path = self._segment_file(number)
+        return path + ".gz" if self.compress else path
+
+    def _read_index(self) -> list:
+        """The sealed segments, oldest first: {"segment", "first", "last", "count"}"""
+        if not os.path.exists(self.index_file):
+            return []
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            return json.load(f)["segments"]
+
+    def _read_segment(self, number: int) -> list:
+        records = []
+        path = self._segment_file(number)
+        if os.path.exists(path + ".gz"):
+            f = gzip.open(path + ".gz", 'rt', encoding='utf-8')
+        elif os.path.exists(path):
+            f = open(path, 'r', encoding='utf-8')
+        else:
+            return records
+        with f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # torn line of an interrupted append
+        return records
+
+    def _open_count(self, number: int) -> int:
+        """How many records open segment number holds
+
+        ``open.json`` notes the count with the segment's size at the time; it
+        is only trusted while the size still matches (it isn't fsynced, and
+        an append may be cut short), otherwise the segment is counted again.
+        """
+        path = self._open_segment_file(number)
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(self.open_file, 'r', encoding='utf-8') as f:
+                noted = json.load(f)
+            if noted["segment"] == number and noted["size"] == os.path.getsize(path):
+                return noted["count"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        with (gzip.open(path, 'rb') if self.compress else open(path, 'rb')) as f:
+            return f.read().count(b"\n")
+
+    def _note_open_count(self, number: int, count: int):
+        with open(self.open_file, 'w', encoding='utf-8') as f:
+            json.dump({"segment": number, "count": count,
+                       "size": os.path.getsize(self._open_segment_file(number))}, f)
+
+    def append(self, records):
+        """Add records (oldest first) to the archive; the caller holds the guild's lock"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._read_index()
+        number = len(segments) + 1
+        if self.compress and os.path.exists(self._segment_file(number)):
+            self._compress_open(number)
+        held = self._open_count(number)
+        records = list(records)
+        while records:
+            room = self.segment_records - held
+            batch, records = records[:room], records[room:]
+            self._write_records(number, batch)
+            held += len(batch)
+            if held >= self.segment_records:
+                self._seal(segments, number)
+                number += 1
+                held = 0
+            else:
+                self._note_open_count(number, held)
+
+    def _write_records(self, number: int, records: list):
+        if not records:
+            return
+        path = self._segment_file(number)
+        lines = "".join(json.dumps(record, ensure_ascii=False, separators=(',', ':'),
+                                   default=json_default) + "\n" for record in records)
+        if self.compress:
+            # Rewritten as a whole, so an interrupted append leaves the old segment intact
+            raw = b""
+            if os.path.exists(path + ".gz"):
+                with gzip.open(path + ".gz", 'rb') as f:
+                    raw = f.read()
+            with atomic_write(path + ".gz", self.durability) as temp_file:
+                with gzip.open(temp_file, 'wb') as f:
+                    f.write(raw + lines.encode('utf-8'))
+            return
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = "\n" + lines  # start on a fresh line if an earlier append was cut short
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            if self.durability == "safe":
+                f.flush()
+                with phase("fsync"):
+                    os.fsync(f.fileno())
+
+    def _compress_open(self, number: int):
+        """Gzip an open segment written before the archive was compressed"""
+        path = self._segment_file(number)
+        if not os.path.exists(path + ".gz"):  # else gzipped already, but not yet removed
+            with open(path, 'rb') as f:
+                raw = f.read()
+            if raw and not raw.endswith(b"\n"):
+                raw += b"\n"  # an earlier append was cut short
+            with atomic_write(path + ".gz", self.durability) as temp_file:
+                with gzip.open(temp_file, 'wb') as f:
+                    f.write(raw)
+        os.remove(path)
+
+    def _seal(self, segments: list, number: int):
+        path = self._segment_file(number)
+        if not self.compress:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            with atomic_write(path + ".gz", self.durability) as temp_file:
+                with gzip.open(temp_file, 'wb') as f:
+                    f.write(raw)
+        stamps = [record.get(self.time_field) or "" for record in self._read_segment(number)]
+        segments.append({"segment": number, "first": min(stamps), "last": max(stamps), "count": len(stamps)})
+        with atomic_write(self.index_file, self.durability) as temp_file:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"segments": segments}, f, separators=(',', ':'))
+        if not self.compress:
+            os.remove(path)
+        elif os.path.exists(path + ".gz.bak"):
+            os.remove(path + ".gz.bak")  # the open segment's previous version, kept by atomic_write
+
+    def count(self) -> int:
+        """How many records the archive holds"""
+        segments = self._read_index()
+        return sum(segment["count"] for segment in segments) + self._open_count(len(segments) + 1)
+
+    def range(self, since: str = None, until: str = None, limit: int = None) -> list:
+        """Records stamped between since and until (see in_range), newest first, up to limit"""
+        if limit is not None and limit <= 0:
+            return []
+        segments = self._read_index()
+        candidates = [segment for segment in segments
+                      if (since is None or segment["last"] >= since)
+                      and (until is None or segment["first"][:len(until)] <= until)]
+        # The open segment has no indexed span yet and holds the newest records
+        candidates.append({"segment": len(segments) + 1, "last": None})
+        field = self.time_field
+        found = []
+        for segment in sorted(candidates, key=lambda segment: (segment["last"] is None, segment["last"] or ""),
+                              reverse=True):
+            if limit is not None and len(found) >= limit and segment["last"] is not None \
+                    and segment["last"] < found[limit - 1][field]:
+                break  # nothing older can make the cut
+            found.extend(record for record in self._read_segment(segment["segment"])
+                         if in_range(record.get(field) or "", since, until))
+            if limit is not None:
+                found.sort(key=lambda record: record.get(field) or "", reverse=True)
+                del found[limit:]
+        if limit is None:
+            found.sort(key=lambda record: record.get(field) or "", reverse=True)
+        return found
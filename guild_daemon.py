@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Guild daemon for the Fantasy Guild Manager
+Keeps one GuildManager loaded and runs commands sent over a Unix socket.
+
+Run as a script, this module is the thin client:
+
+    python guild_daemon.py [--data FILE | --socket PATH] member list
+"""
+
+import json
+import socket
+import sys
+
+
+def default_socket(data_file: str) -> str:
+    """The socket a daemon for data_file listens on unless told otherwise"""
+    return data_file + ".sock"
+
+
+def send_command(socket_path: str, argv):
+    """Send one command (a list of arguments) to a running daemon and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        conn.sendall((json.dumps(list(argv)) + "\n").encode('utf-8'))
+        reply = conn.makefile('rb').readline()
+    if not reply:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(reply)
+
+
+class GuildDaemon:
+    """Runs commands against one resident guild and group-commits their changes
+
+    Commands run one at a time under a lock. A command that changes the
+    guild isn't answered until its change is saved, but saves happen at most
+    once per commit interval, so every write that arrives meanwhile shares
+    the same save (and fsync).
+    """
+
+    def __init__(self, guild, commit_interval: float = 0.01):
+        import threading
+        from guild_manager import CommandParser, build_parser
+
+        self.guild = guild
+        self.commit_interval = commit_interval
+        self.parser = build_parser(CommandParser)
+        self.lock = threading.Lock()
+        self.work = threading.Condition(self.lock)
+        self.committed = threading.Condition(self.lock)
+        self.commits = 0
+        self.commit_error = None
+
+    def execute(self, argv) -> dict:
+        """Run one command and return {"ok": ..., "output": ...}"""
+        import contextlib
+        import io
+        from guild_manager import parse_line, run_line
+
+        output = io.StringIO()
+        ok = True
+        with self.lock:
+            try:
+                with contextlib.redirect_stdout(output):
+                    self._refresh()
+                    run_line(self.guild, parse_line(self.parser, argv, "the daemon"))
+            except Exception as e:
+                ok = False
+                output.write(f"Error: {e}\n")
+            except SystemExit:
+                pass  # --help
+            if self.guild._changes:
+                # Answer only once the change is on disk
+                target = self.commits + 1
+                self.work.notify()
+                while self.commits < target:
+                    self.committed.wait()
+                if self.commit_error:
+                    ok = False
+                    output.write(f"Error: {self.commit_error}\n")
+        return {"ok": ok, "output": output.getvalue()}
+
+    def _refresh(self):
+        """Pick up saves made by other processes since we last loaded or saved"""
+        guild = self.guild
+        if guild.storage.transactional or guild.lock.peek_version() == guild.version:
+            return
+        if guild._changes:
+            guild._reapply_changes()
+        else:
+            guild.data = guild.load_data()
+
+    def commit_loop(self):
+        """Save pending changes, at most once per commit interval"""
+        import time
+
+        while True:
+            with self.lock:
+                while not self.guild._changes:
+                    self.work.wait()
+            # Let more writes join this commit
+            time.sleep(self.commit_interval)
+            with self.lock:
+                try:
+                    self.guild.flush()
+                    self.commit_error = ("could not save guild data (see the daemon's log)"
+                                         if self.guild._changes else None)
+                except Exception as e:
+                    self.commit_error = str(e)
+                self.commits += 1
+                self.committed.notify_all()
+
+
+def serve(guild, socket_path: str, commit_interval: float = 0.01):
+    """Serve commands for guild on a Unix socket until interrupted"""
+    import os
+    import signal
+    import socketserver
+    import threading
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("the guild daemon needs Unix domain sockets, which this platform lacks")
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)  # left behind by a daemon that didn't shut down cleanly
+        else:
+            raise OSError(f"a daemon is already listening on {socket_path}")
+
+    daemon = GuildDaemon(guild, commit_interval)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    argv = json.loads(line)
+                    if not isinstance(argv, list):
+                        raise ValueError("expected a list of arguments")
+                    response = daemon.execute([str(arg) for arg in argv])
+                except ValueError as e:
+                    response = {"ok": False, "output": f"Error: bad request ({e})\n"}
+                self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    with guild.batch():
+        threading.Thread(target=daemon.commit_loop, daemon=True).start()
+        server = Server(socket_path, Handler)
+        os.chmod(socket_path, 0o600)
+        print(f"[+] Guild daemon listening on {socket_path} (Ctrl-C to stop)")
+        # Stop as cleanly on SIGTERM as on Ctrl-C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            # Hold the lock so a half-run command isn't saved; leaving batch() saves the rest
+            daemon.lock.acquire()
+    print("[+] Guild daemon stopped")
+
+
+def main():
+    argv = sys.argv[1:]
+    data_file = "guild_data.json"
+    socket_path = None
+    while argv and argv[0] in ("--data", "--socket") and len(argv) > 1:
+        if argv[0] == "--data":
+            data_file = argv[1]
+        else:
+            socket_path = argv[1]
+        argv = argv[2:]
+    if not argv:
+        print("usage: guild_daemon.py [--data FILE | --socket PATH] COMMAND [ARGS...]")
+        sys.exit(2)
+
+    socket_path = socket_path or default_socket(data_file)
+    try:
+        response = send_command(socket_path, argv)
+    except OSError as e:
+        print(f"[-] Could not reach the guild daemon on {socket_path}: {e}")
+        print(f"    Start it with: python guild_manager.py --data {data_file} serve-daemon")
+        sys.exit(1)
+    sys.stdout.write(response["output"])
+    sys.exit(0 if response["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
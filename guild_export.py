@@ -0,0 +1,117 @@
+"""
+Export for the Fantasy Guild Manager
+Streams members, quests, items or announcements to CSV, TSV or JSONL
+"""
+
+import csv
+import itertools
+import json
+import sys
+from typing import Any, Iterator, List, Tuple
+
+from guild_index import filter_records
+from guild_model import field_reader
+
+EXPORT_KINDS = ["members", "quests", "items", "announcements"]
+EXPORT_FORMATS = ["csv", "tsv", "jsonl"]
+
+# kind: fields exported by default, in column order ("id" is the record's key)
+EXPORT_FIELDS = {
+    "members": ["id", "name", "class", "level", "description", "status", "joined_date"],
+    "quests": ["id", "title", "description", "reward", "difficulty", "status", "created_date", "completed_date"],
+    "items": ["name", "quantity"],
+    "announcements": ["date", "message"],
+}
+
+# Rows handed to the writer at a time
+CHUNK_ROWS = 1000
+
+
+def detect_format(path: str) -> str:
+    """Guess the output format from the file extension"""
+    lowered = path.lower()
+    if lowered.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if lowered.endswith(".tsv"):
+        return "tsv"
+    return "csv"
+
+
+def parse_fields(kind: str, fields: str = None) -> List[str]:
+    """The fields to export from a comma-separated list, checked against the kind"""
+    if not fields:
+        return EXPORT_FIELDS[kind]
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS[kind]]
+    if unknown or not selected:
+        raise ValueError(f"Unknown {kind} field(s): {', '.join(unknown) or fields!r}. "
+                         f"Choose from {', '.join(EXPORT_FIELDS[kind])}")
+    return selected
+
+
+def export_records(guild, kind: str, match=None, low=None, high=None, sort: str = None,
+                   descending: bool = False, limit: int = None) -> Iterator[Tuple[str, Any]]:
+    """Yield (key, record) pairs to export, one at a time where possible
+
+    Unsorted exports stream straight from the collection (or an SQLite
+    cursor). Sorting needs every match at once, so it goes through
+    GuildManager.query() and holds the matching ids.
+    """
+    if kind == "items":
+        yield from itertools.islice(((name, {"name": name, "quantity": quantity}) for name, quantity in
+                                     guild.data["resources"]["items"].items()), limit)
+        return
+    if kind == "announcements":
+        yield from itertools.islice(((str(position), announcement) for position, announcement in
+                                     enumerate(guild.data["announcements"])), limit)
+        return
+    records = guild.data[kind]
+    if sort is not None or descending:
+        yield from guild.query(kind, match, low, high, sort, descending, limit)
+    elif hasattr(records, "iter_query"):
+        yield from records.iter_query(match, low, high, limit=limit)
+    else:
+        yield from itertools.islice(filter_records(kind, records, match, low, high), limit)
+
+
+def write_records(f, records: Iterator[Tuple[str, Any]], kind: str, fields: List[str], output_format: str,
+                  header: bool = True) -> int:
+    """Write records to a text file object and return how many were written"""
+    read = field_reader(kind, [field for field in fields if field != "id"])
+    if fields[:1] == ["id"] and "id" not in fields[1:]:
+        def values(key, record):
+            return (key,) + read(record)
+    else:
+        def values(key, record):
+            found = iter(read(record))
+            return [key if field == "id" else next(found) for field in fields]
+
+    count = 0
+    if output_format == "jsonl":
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        while True:
+            chunk = [dumps(dict(zip(fields, values(key, record)))) for key, record in
+                     itertools.islice(records, CHUNK_ROWS)]
+            if not chunk:
+                break
+            f.write("\n".join(chunk) + "\n")
+            count += len(chunk)
+        return count
+
+    writer = csv.writer(f, dialect="excel-tab" if output_format == "tsv" else "excel")
+    if header:
+        writer.writerow(fields)
+    while True:
+        chunk = [values(key, record) for key, record in itertools.islice(records, CHUNK_ROWS)]
+        if not chunk:
+            break
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def open_output(path: str):
+    """A large-buffered text file for path, or stdout for "-" """
+    if path == "-":
+        return sys.stdout
+    return open(path, 'w', encoding='utf-8', newline='', buffering=1 << 20)
@@ -0,0 +1,179 @@
+"""
+Point-in-time history for the Fantasy Guild Manager
+Keeps the changes of every save plus a copy of the data files every so
+often, so the guild can be rebuilt as it was at any past moment (--as-of)
+"""
+
+import json
+import os
+import shutil
+
+from guild_archive import SegmentArchive, in_range
+from guild_model import compact_guild
+from guild_storage import apply_change, open_storage, plain_data
+from guild_timing import phase
+
+# Saves between snapshots; rebuilding a past state replays at most this many
+SNAPSHOT_EVERY = 100
+# A save carrying more records than this is recorded as a snapshot rather than replayed
+SNAPSHOT_ROWS = 10000
+
+
+def change_rows(change) -> int:
+    """How many records a change carries: every entry of a merge, else one"""
+    return len(change["value"]) if change["op"] == "merge" else 1
+
+
+class GuildHistory:
+    """The history of one guild, in ``<data_file>.history/``
+
+    ``snapshots/<version>/`` holds a copy of the guild's data files as saved
+    at that version, listed in ``snapshots.jsonl`` with their time and
+    backend; ``deltas/`` is a SegmentArchive of the changes each save made.
+    A past state is the newest snapshot taken by then, loaded with its own
+    backend, with the later deltas up to that time applied on top, so its
+    cost is bounded by SNAPSHOT_EVERY rather than by the length of the
+    history.
+
+    Snapshots are copied from the files the storage wrote, never serialized
+    from memory. Saves replace those files rather than rewrite them, so
+    record() only opens them while the guild's lock is held and
+    take_snapshot() copies them once it is released. SQLite databases are
+    copied with SQLite's online backup, which steps aside for writers.
+    """
+
+    def __init__(self, data_file: str, durability: str = "safe"):
+        self.data_file = data_file
+        self.directory = data_file + ".history"
+        self.durability = durability
+        self.snapshots_file = os.path.join(self.directory, "snapshots.jsonl")
+        self.deltas = SegmentArchive(os.path.join(self.directory, "deltas"), "time", durability)
+
+    def _snapshot_dir(self, version: int) -> str:
+        return os.path.join(self.directory, "snapshots", f"{version:08d}")
+
+    def _snapshots(self) -> list:
+        """The snapshots taken and the times history was switched off, by version: {"version", "time", ...}"""
+        snapshots = []
+        if not os.path.exists(self.snapshots_file):
+            return snapshots
+        with open(self.snapshots_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    snapshots.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # torn line of an interrupted append
+        # Snapshots are listed once copied, which needn't be in the order they were taken
+        snapshots.sort(key=lambda snapshot: snapshot["version"])
+        return snapshots
+
+    def _list(self, entry: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.snapshots_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def record(self, storage, changes, version: int, time: str):
+        """Keep a save's changes; called with the guild's lock held
+
+        ``time`` is when the save happened, taken under the lock so saves are
+        stamped in the order they were made. Every SNAPSHOT_EVERY saves, and
+        for a save carrying more than SNAPSHOT_ROWS records (which is then
+        not kept as changes), the saved files are pinned for a snapshot:
+        the return value is to be passed to take_snapshot() once the lock is
+        released. Otherwise it is None.
+        """
+        snapshots = self._snapshots()
+        rows = sum(change_rows(change) for change in changes)
+        if rows <= SNAPSHOT_ROWS:
+            self.deltas.append([{"version": version, "time": time, "changes": changes}])
+        if (snapshots and not snapshots[-1].get("stopped") and rows <= SNAPSHOT_ROWS
+                and version - snapshots[-1]["version"] < SNAPSHOT_EVERY):
+            return None
+        pinned = []
+        if not storage.transactional:
+            base = os.path.dirname(os.path.abspath(self.data_file))
+            try:
+                for path in storage.saved_files():
+                    f = open(path, 'rb')
+                    # Journals grow in place; only what this save wrote belongs to it
+                    pinned.append((os.path.relpath(os.path.abspath(path), base), f, os.fstat(f.fileno()).st_size))
+            except OSError:
+                for _, f, _ in pinned:
+                    f.close()
+                raise
+        snapshot = (storage, version, time, pinned)
+        if os.name == 'nt':
+            # Windows can't replace a file that is held open, so copy it now
+            self.take_snapshot(snapshot)
+            return None
+        return snapshot
+
+    def take_snapshot(self, snapshot):
+        """Copy the files record() pinned into the history and list the snapshot; called without the lock"""
+        storage, version, time, pinned = snapshot
+        directory = self._snapshot_dir(version)
+        partial = directory + ".tmp"
+        try:
+            if os.path.isdir(partial):
+                shutil.rmtree(partial)  # left by a copy that was cut short
+            os.makedirs(partial)
+            if storage.transactional:
+                copied = storage.backup(os.path.join(partial, os.path.basename(self.data_file)))
+                # Another writer may have committed since our save; the copy is of its version then
+                if copied["version"] != version:
+                    version, time = copied["version"], copied["last_updated"]
+                    directory = self._snapshot_dir(version)
+            for relative, source, size in pinned:
+                path = os.path.join(partial, relative)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    while size > 0:
+                        block = source.read(min(size, 1 << 20))
+                        if not block:
+                            break
+                        f.write(block)
+                        size -= len(block)
+                    if self.durability == "safe":
+                        f.flush()
+                        with phase("fsync"):
+                            os.fsync(f.fileno())
+            os.replace(partial, directory)
+        finally:
+            for _, source, _ in pinned:
+                source.close()
+            if os.path.isdir(partial):
+                shutil.rmtree(partial, ignore_errors=True)
+        self._list({"version": version, "time": time, "backend": storage.backend})
+
+    def stop(self, version: int, time: str):
+        """Note that history is switched off from this save on; called with the guild's lock held"""
+        self._list({"version": version, "time": time, "stopped": True})
+
+    def first_time(self) -> str:
+        """When the history starts (None if nothing was recorded yet)"""
+        snapshots = [snapshot for snapshot in self._snapshots() if not snapshot.get("stopped")]
+        return snapshots[0]["time"] if snapshots else None
+
+    def as_of(self, when: str):
+        """The guild data as it was at when (see guild_archive.in_range), or None if history wasn't kept then"""
+        snapshots = [snapshot for snapshot in self._snapshots() if in_range(snapshot["time"], until=when)]
+        if not snapshots or snapshots[-1].get("stopped"):
+            return None
+        base = snapshots[-1]
+        storage = open_storage(os.path.join(self._snapshot_dir(base["version"]), os.path.basename(self.data_file)),
+                               base["backend"])
+        data = storage.load()
+        if storage.transactional:
+            # Table views would write the deltas into the snapshot; take a copy instead
+            data = compact_guild(plain_data(data))
+            storage.conn.close()
+        deltas = sorted((delta for delta in self.deltas.range(base["time"], when)
+                         if delta["version"] > base["version"]), key=lambda delta: delta["version"])
+        versions = [delta["version"] for delta in deltas]
+        if versions != list(range(base["version"] + 1, base["version"] + 1 + len(versions))):
+            print(f"Warning: the history is missing some saves after version {base['version']}; "
+                  f"the guild may not be shown exactly as it was")
+        for delta in deltas:
+            for change in delta["changes"]:
+                apply_change(data, change)
+        return data
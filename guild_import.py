@@ -0,0 +1,161 @@
+"""
+Bulk import for the Fantasy Guild Manager
+Streams members, quests or items from CSV or JSONL files into a guild
+"""
+
+import csv
+import json
+import sys
+from datetime import datetime
+from typing import Dict, Any, Iterator, Tuple
+
+IMPORT_KINDS = ["members", "quests", "items"]
+IMPORT_FORMATS = ["csv", "jsonl"]
+MEMBER_STATUSES = ["active", "inactive"]
+QUEST_STATUSES = ["available", "completed"]
+DIFFICULTIES = ["Easy", "Normal", "Hard", "Legendary"]
+
+
+def detect_format(path: str) -> str:
+    """Guess the input format from the file extension"""
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(path: str, input_format: str = None) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, row) pairs one at a time; "-" reads from stdin
+
+    A JSONL line that isn't valid JSON is yielded as a ValueError, so the
+    caller can reject that row and carry on.
+    """
+    input_format = input_format or detect_format(path)
+    f = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        if input_format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, ValueError(f"invalid JSON ({e.msg})")
+                    continue
+                yield line_number, row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _text(row: Dict[str, Any], field: str, default: str = "") -> str:
+    value = row.get(field)
+    if value is None:
+        return default
+    return str(value).strip() or default
+
+
+def _whole_number(row: Dict[str, Any], field: str, default: int = None) -> int:
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        if default is None:
+            raise ValueError(f"{field} is required")
+        return default
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} must be a whole number, got {value!r}")
+
+
+def _choice(row: Dict[str, Any], field: str, choices, default: str) -> str:
+    value = _text(row, field, default)
+    for choice in choices:
+        if value.lower() == choice.lower():
+            return choice
+    raise ValueError(f"{field} must be one of {', '.join(choices)}, got {value!r}")
+
+
+def build_member(row: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Validate a member row and return its id and record"""
+    name = _text(row, "name")
+    if not name:
+        raise ValueError("name is required")
+    level = _whole_number(row, "level", 1)
+    if level < 1:
+        raise ValueError("level must be at least 1")
+    return name.lower().replace(" ", "_"), {
+        "name": name,
+        "class": _text(row, "class", "Adventurer"),
+        "level": level,
+        "description": _text(row, "description"),
+        "status": _choice(row, "status", MEMBER_STATUSES, "active"),
+        "joined_date": _text(row, "joined_date") or datetime.now().isoformat()
+    }
+
+
+def build_quest(row: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Validate a quest row and return its id and record"""
+    title = _text(row, "title")
+    if not title:
+        raise ValueError("title is required")
+    quest = {
+        "title": title,
+        "description": _text(row, "description", "No description provided"),
+        "reward": _text(row, "reward"),
+        "difficulty": _choice(row, "difficulty", DIFFICULTIES, "Normal"),
+        "status": _choice(row, "status", QUEST_STATUSES, "available"),
+        "created_date": _text(row, "created_date") or datetime.now().isoformat()
+    }
+    if quest["status"] == "completed":
+        quest["completed_date"] = _text(row, "completed_date") or datetime.now().isoformat()
+    return title.lower().replace(" ", "_"), quest
+
+
+def build_item(row: Dict[str, Any]) -> Tuple[str, int]:
+    """Validate an item row and return its name and quantity"""
+    name = _text(row, "name") or _text(row, "item")
+    if not name:
+        raise ValueError("name is required")
+    quantity = _whole_number(row, "quantity")
+    if quantity == 0:
+        raise ValueError("quantity must not be 0")
+    return name, quantity
+
+
+BUILDERS = {"members": build_member, "quests": build_quest, "items": build_item}
+
+
+class ImportReport:
+    """Counts of an import, plus details of the first few rejected rows"""
+
+    MAX_DETAILS = 20
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.details = []
+
+    def reject(self, line_number: int, reason: str):
+        self.rejected += 1
+        if len(self.details) < self.MAX_DETAILS:
+            self.details.append((line_number, reason))
+
+
+def read_records(path: str, kind: str, input_format: str = None,
+                 report: ImportReport = None) -> Iterator[Tuple[str, Any]]:
+    """Yield validated (key, value) records of the given kind, noting rejected rows in report"""
+    build = BUILDERS[kind]
+    report = report if report is not None else ImportReport()
+    for line_number, row in read_rows(path, input_format):
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("expected an object")
+            record = build(row)
+        except ValueError as e:
+            report.reject(line_number, str(e))
+            continue
+        report.imported += 1
+        yield record
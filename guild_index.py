@@ -0,0 +1,319 @@
+"""
+Secondary indexes for the Fantasy Guild Manager
+Answers filtered, sorted and limited listings and fuzzy name lookups
+without scanning a whole collection
+"""
+
+import heapq
+import itertools
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+
+# collection: (fields matched exactly, field kept in sorted order)
+INDEXED_FIELDS = {
+    "members": (("class", "status"), "level"),
+    "quests": (("status", "difficulty"), None),
+}
+
+# collection: field that names a record
+NAME_FIELDS = {"members": "name", "quests": "title"}
+
+# Least trigram similarity (0 to 1) for a name to be suggested
+SUGGEST_SIMILARITY = 0.3
+# Trigrams in more names than this (or a twentieth of the roster) don't pick candidates
+SUGGEST_COMMON = 100
+# Most names scored exactly per suggestion
+SUGGEST_CANDIDATES = 2000
+
+# collection: {--sort name: record field}
+SORT_FIELDS = {
+    "members": {"name": "name", "level": "level", "joined": "joined_date"},
+    "quests": {"title": "title", "created": "created_date"},
+}
+
+
+def match_key(value) -> str:
+    """How an exactly matched field is compared: case doesn't matter"""
+    return str(value).lower()
+
+
+def sort_key(value):
+    """How a record sorts on a field; missing values sort first and text ignores case"""
+    if value is None:
+        return (0, "")
+    if isinstance(value, str):
+        return (1, value.lower())
+    return (1, value)
+
+
+def number_key(value):
+    """How the sorted (numeric) field is kept in the index; anything but a number sorts first"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return float("-inf")
+
+
+def changed_keys(change):
+    """The record ids a change to a collection touches, or None if an index can't follow it"""
+    path = change["path"]
+    if len(path) == 2:
+        return [path[1]]
+    if len(path) == 1 and change["op"] == "merge":
+        return list(change["value"])
+    return None
+
+
+def normalize_name(name) -> str:
+    """How names are compared: case and repeated spaces don't matter"""
+    return " ".join(str(name).lower().split())
+
+
+def trigrams(text: str, padded: bool = True) -> set:
+    """The three-letter pieces of text; padding marks where words start and end"""
+    if padded:
+        text = f"  {text} "
+    return {text[position:position + 3] for position in range(len(text) - 2)}
+
+
+def filter_records(collection: str, records, match=None, low=None, high=None):
+    """Yield the (id, record) pairs that match, in collection order, one at a time"""
+    ranged = INDEXED_FIELDS[collection][1]
+    wanted = [(field, match_key(value)) for field, value in (match or {}).items()]
+    for key, record in records.items():
+        if any(match_key(record.get(field)) != value for field, value in wanted):
+            continue
+        if low is not None or high is not None:
+            value = number_key(record.get(ranged))
+            if (low is not None and value < low) or (high is not None and value > high):
+                continue
+        yield key, record
+
+
+def scan(collection: str, records, match=None, low=None, high=None, sort: str = None,
+         descending: bool = False, limit: int = None):
+    """Answer a query like CollectionIndex.query does, by going through every record once
+
+    Cheaper than building the indexes when only one query is asked.
+    """
+    matches = filter_records(collection, records, match, low, high)
+    if sort is None and not descending:
+        return list(itertools.islice(matches, limit))
+    found = [(position, key, record) for position, (key, record) in enumerate(matches)]
+    if sort is not None:
+        key_of = number_key if sort == INDEXED_FIELDS[collection][1] else sort_key
+        found.sort(key=lambda entry: (key_of(entry[2].get(sort)), entry[0]), reverse=descending)
+    else:
+        found.reverse()
+    return [(key, record) for _, key, record in found[:limit]]
+
+
+class CollectionIndex:
+    """Indexes over one in-memory collection (members or quests)
+
+    Keeps a set of record ids per value of each exactly matched field, a
+    sorted list of (value, position, id) for the numeric sorted field and each
+    record's insertion position, so listings come out in the same order as
+    an unfiltered one. GuildManager updates it as changes are applied
+    rather than rebuilding it.
+    """
+
+    def __init__(self, collection: str, records):
+        self.collection = collection
+        self.records = records
+        self.match_fields, self.sorted_field = INDEXED_FIELDS[collection]
+        self.matches = {field: {} for field in self.match_fields}
+        self.sorted = []
+        self.positions = {}
+        self._next_position = itertools.count()
+        self._build()
+
+    def _build(self):
+        # In bulk: one pass per field, and each distinct value is lowered once
+        for key in self.records:
+            self.positions[key] = next(self._next_position)
+        for field in self.match_fields:
+            by_value = {}
+            for key, record in self.records.items():
+                by_value.setdefault(record.get(field), []).append(key)
+            for value, keys in by_value.items():
+                self.matches[field].setdefault(match_key(value), set()).update(keys)
+        if self.sorted_field:
+            # Records come in position order, so a stable sort on the value alone is enough
+            self.sorted = sorted(((number_key(record.get(self.sorted_field)), self.positions[key], key)
+                                  for key, record in self.records.items()), key=itemgetter(0))
+
+    def keys_of(self, change):
+        """The record ids a change touches, or None if the index can't follow it"""
+        return changed_keys(change)
+
+    def add(self, key: str):
+        """Index the record stored under key (or forget key if it's gone)"""
+        record = self.records.get(key)
+        if record is None:
+            self.positions.pop(key, None)
+            return
+        # A replaced record keeps its place, like it does in the collection
+        position = self.positions.setdefault(key, next(self._next_position))
+        for field in self.match_fields:
+            self.matches[field].setdefault(match_key(record.get(field)), set()).add(key)
+        if self.sorted_field:
+            insort(self.sorted, (number_key(record.get(self.sorted_field)), position, key))
+
+    def remove(self, key: str):
+        """Drop the record stored under key from the indexes, before it changes"""
+        record = self.records.get(key)
+        if record is None:
+            return
+        for field in self.match_fields:
+            keys = self.matches[field].get(match_key(record.get(field)))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.matches[field][match_key(record.get(field))]
+        if self.sorted_field:
+            entry = (number_key(record.get(self.sorted_field)), self.positions[key], key)
+            index = bisect_left(self.sorted, entry)
+            if index < len(self.sorted) and self.sorted[index] == entry:
+                del self.sorted[index]
+
+    def query(self, match=None, low=None, high=None, sort: str = None, descending: bool = False,
+              limit: int = None):
+        """Return the (id, record) pairs that match, in order and up to limit
+
+        ``match`` maps fields to the value they must have, ``low``/``high``
+        bound the sorted field and ``sort`` names a record field to order
+        by (insertion order otherwise).
+        """
+        candidates = None
+        for field, value in sorted((match or {}).items(),
+                                   key=lambda item: len(self.matches[item[0]].get(match_key(item[1]), ()))):
+            keys = self.matches[field].get(match_key(value), set())
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return []
+
+        entries = None
+        if low is not None or high is not None:
+            start = 0 if low is None else bisect_left(self.sorted, (low,))
+            end = len(self.sorted) if high is None else bisect_right(
+                self.sorted, (high, float("inf")))
+            entries = self.sorted[start:end]
+
+        if sort is not None and sort == self.sorted_field:
+            # Walk the sorted index and stop as soon as enough records matched
+            ordered = self.sorted if entries is None else entries
+            keys = (key for _, _, key in (reversed(ordered) if descending else ordered)
+                    if candidates is None or key in candidates)
+        else:
+            if entries is not None:
+                in_range = {key for _, _, key in entries}
+                candidates = in_range if candidates is None else candidates & in_range
+            if candidates is None:
+                keys = self.positions
+            else:
+                keys = sorted(candidates, key=self.positions.__getitem__)
+            if sort is not None:
+                keys = sorted(keys, key=lambda key: (sort_key(self.records[key].get(sort)),
+                                                     self.positions[key]), reverse=descending)
+            elif descending:
+                keys = reversed(list(keys))
+        return [(key, self.records[key]) for key in itertools.islice(keys, limit)]
+
+
+class NameIndex:
+    """Trigram index over member names or quest titles
+
+    Every name is broken into overlapping three-letter pieces, and each piece
+    maps to the records whose name contains it. A mistyped name still shares
+    most of its pieces with the intended one, so suggestions only look at
+    records sharing a piece rather than comparing against every name.
+    Names are also kept sorted for type-ahead listings.
+    """
+
+    def __init__(self, collection: str, records):
+        self.collection = collection
+        self.records = records
+        self.field = NAME_FIELDS[collection]
+        self.grams = {}
+        self.names = {}
+        self.sizes = {}
+        for key, record in records.items():
+            self._index(key, record)
+        self.sorted = sorted((name, key) for key, name in self.names.items())
+
+    def keys_of(self, change):
+        """The record ids a change touches, or None if the index can't follow it"""
+        return changed_keys(change)
+
+    def _index(self, key: str, record):
+        name = normalize_name(record.get(self.field, ""))
+        self.names[key] = name
+        grams = trigrams(name)
+        self.sizes[key] = len(grams)
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(key)
+
+    def add(self, key: str):
+        """Index the record stored under key, if there is one"""
+        record = self.records.get(key)
+        if record is not None:
+            self._index(key, record)
+            insort(self.sorted, (self.names[key], key))
+
+    def remove(self, key: str):
+        """Drop the record stored under key from the index, before it changes"""
+        name = self.names.pop(key, None)
+        if name is None:
+            return
+        del self.sizes[key]
+        for gram in trigrams(name):
+            keys = self.grams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.grams[gram]
+        position = bisect_left(self.sorted, (name, key))
+        if position < len(self.sorted) and self.sorted[position] == (name, key):
+            del self.sorted[position]
+
+    def suggest(self, text: str, limit: int = 3, accept=None) -> list:
+        """Keys of the records whose names are most like text, best first
+
+        Similarity is the Dice coefficient of the trigram sets. Candidates
+        come from the query's rarer trigrams only: a piece most names share
+        ("adv" in a guild of Adventurers) says little and would mean scoring
+        the whole roster. ``accept`` optionally filters the keys.
+        """
+        wanted = trigrams(normalize_name(text))
+        by_rarity = sorted(wanted, key=lambda gram: len(self.grams.get(gram, ())))
+        common = max(SUGGEST_COMMON, len(self.names) // 20)
+        rare = [gram for gram in by_rarity if len(self.grams.get(gram, ())) <= common] or by_rarity[:1]
+        shared = {}
+        for gram in rare:
+            for key in self.grams.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        if len(shared) > SUGGEST_CANDIDATES:
+            shared = dict(heapq.nlargest(SUGGEST_CANDIDATES, shared.items(), key=itemgetter(1)))
+        scored = []
+        for key in shared:
+            similarity = 2 * len(wanted & trigrams(self.names[key])) / (len(wanted) + self.sizes[key])
+            if similarity >= SUGGEST_SIMILARITY and (accept is None or accept(key)):
+                scored.append((similarity, key))
+        return [key for _, key in heapq.nsmallest(limit, scored, key=lambda item: (-item[0], self.names[item[1]]))]
+
+    def matching(self, text: str):
+        """Yield the keys of records whose name contains text, in name order"""
+        text = normalize_name(text)
+        if len(text) < 3:
+            # Too short for trigrams; walk the names in order, which stops early under a limit
+            for name, key in self.sorted:
+                if text in name:
+                    yield key
+            return
+        candidates = None
+        for gram in sorted(trigrams(text, padded=False), key=lambda gram: len(self.grams.get(gram, ()))):
+            keys = self.grams.get(gram, set())
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return
+        yield from sorted((key for key in candidates if text in self.names[key]), key=lambda key: (self.names[key], key))
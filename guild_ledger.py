@@ -0,0 +1,82 @@
+"""
+Gold and item ledger for the Fantasy Guild Manager
+Every movement of gold or items is kept as an entry in append-only archive
+segments, and per-day and per-week totals are kept up to date in the guild
+data as movements happen, so reports never have to read the entries
+"""
+
+from datetime import date, timedelta
+
+from guild_archive import in_range
+
+# Rollup periods and how an entry's time maps to one: a day, or the Monday starting its week
+PERIODS = ["day", "week"]
+
+
+def period_start(period: str, time: str) -> str:
+    """The key of the day or week (its Monday) an ISO time falls in"""
+    day = time[:10]
+    if period == "day":
+        return day
+    monday = date.fromisoformat(day)
+    return (monday - timedelta(days=monday.weekday())).isoformat()
+
+
+def period_end(period: str, start: str) -> str:
+    """The last day of the period starting at start"""
+    if period == "day":
+        return start
+    return (date.fromisoformat(start) + timedelta(days=6)).isoformat()
+
+
+def ledger_entry(time: str, gold: int = None, item: str = None, quantity: int = None, reason: str = None,
+                 member: str = None, quest: str = None) -> dict:
+    """One movement of gold or of an item; fields that don't apply are left out"""
+    entry = {"time": time, "gold": gold, "item": item, "quantity": quantity,
+             "reason": reason, "member": member, "quest": quest}
+    return {field: value for field, value in entry.items() if value is not None and value != ""}
+
+
+def rollup_deltas(entry: dict):
+    """Yield (path, delta) increments that fold an entry into the ledger rollups"""
+    for period in PERIODS:
+        base = ["ledger", period, period_start(period, entry["time"])]
+        yield base + ["entries"], 1
+        gold = entry.get("gold")
+        if gold:
+            yield base + ["gold_in" if gold > 0 else "gold_out"], abs(gold)
+        if entry.get("item") and entry.get("quantity"):
+            yield base + ["items", entry["item"]], entry["quantity"]
+
+
+def report(data, period: str = "day", since: str = None, until: str = None, limit: int = None) -> list:
+    """(period start, totals) pairs from the rollups, newest first
+
+    A period is included if any of its days falls between since and until
+    (see guild_archive.in_range). Only the rollups are read, so the cost
+    follows the number of periods, not the number of ledger entries.
+    """
+    rollups = data.get("ledger", {}).get(period, {})
+    starts = [start for start in rollups
+              if (since is None or period_end(period, start) >= since[:10])
+              and (until is None or in_range(start, until=until))]
+    starts.sort(reverse=True)
+    return [(start, rollups[start]) for start in starts[:limit]]
+
+
+def totals_for(data, period: str, time: str) -> dict:
+    """The rollup of the day or week that time falls in (empty if nothing moved)"""
+    return data.get("ledger", {}).get(period, {}).get(period_start(period, time), {})
+
+
+def describe(entry: dict) -> str:
+    """A ledger entry as one line of text"""
+    parts = []
+    if entry.get("gold"):
+        parts.append(f"{entry['gold']:+d} gold")
+    if entry.get("item"):
+        parts.append(f"{entry.get('quantity', 0):+d} {entry['item']}")
+    for field in ("reason", "member", "quest"):
+        if entry.get(field):
+            parts.append(f"{field}: {entry[field]}")
+    return ", ".join(parts)
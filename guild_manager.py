@@ -5,62 +5,365 @@ A command-line tool for managing guild members, quests, and resources
 that generates a web page for party members to view.
 """
 
-import json
+from __future__ import annotations
+
 import os
 import argparse
-from datetime import datetime
-from typing import Dict, List, Any
+import contextlib
 import sys
+import time
+
+TYPE_CHECKING = False  # as in guild_storage: keep typing out of startup
+if TYPE_CHECKING:
+    from typing import Dict, List, Any
+
+import guild_timing
+from guild_index import NAME_FIELDS, SORT_FIELDS
+from guild_storage import (BACKENDS, COMPRESSIONS, DURABILITY_LEVELS, SNAPSHOT_FORMATS, FileLock,
+                           apply_change, open_storage)
+from guild_timing import phase
+
+
+# Announcements kept in the data file for the web page; older ones live only in the archive
+HOT_ANNOUNCEMENTS = 10
+
+
+# Days after completion before quest complete moves a quest to the archive, unless the guild sets its own
+ARCHIVE_AFTER_DAYS = 30
+
+
+def _now() -> str:
+    """The current time as an ISO 8601 string (datetime is only imported once a command needs it)"""
+    from datetime import datetime
+    return datetime.now().isoformat()
+
 
 class GuildManager:
-    def __init__(self, data_file="guild_data.json"):
+    def __init__(self, data_file="guild_data.json", backend=None, as_of: str = None, **storage_options):
         self.data_file = data_file
+        self.storage = open_storage(data_file, backend, **storage_options)
+        # A past date or time to show the guild as of, from its history; the guild is then read-only
+        self.as_of = as_of
+        self.lock = FileLock(data_file + ".lock")
+        self._changes = []
+        # Pending changes whose archive entries are already appended (see _append_archives)
+        self._archived_upto = 0
+        self._batch_depth = 0
         self.data = self.load_data()
     
     def load_data(self) -> Dict[str, Any]:
         """Load guild data from JSON file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                print(f"Warning: Could not load {self.data_file}. Starting with empty data.")
-        
-        # Default guild structure
-        return {
-            "guild_name": "The Unnamed Guild",
-            "guild_description": "A brave band of adventurers",
-            "members": {},
-            "quests": {},
-            "resources": {
-                "gold": 0,
-                "items": {}
-            },
-            "announcements": [],
-            "last_updated": datetime.now().isoformat()
-        }
+        self._changes = []
+        self._archived_upto = 0
+        self._indexes = {}
+        self._names = {}
+        self._search = None
+        with phase("load"):
+            data = self.storage.load() if self.as_of is None else self._load_as_of(self.as_of)
+        self.version = data.get("version", 0)
+        return data
+    
+    def history(self):
+        """The guild's history of saves, in ``<data_file>.history/``"""
+        from guild_history import GuildHistory
+        return GuildHistory(self.data_file, getattr(self.storage, "durability", "safe"))
+    
+    def _load_as_of(self, when: str) -> Dict[str, Any]:
+        from guild_archive import check_time_bound
+        history = self.history()
+        bound = check_time_bound(when)
+        data = history.as_of(bound)
+        if data is None:
+            first = history.first_time()
+            if first is None:
+                reason = "turn it on with 'info --history on'"
+            elif bound < first[:len(bound)]:
+                reason = f"it starts at {first[:19].replace('T', ' ')}"
+            else:
+                reason = "history was switched off then"
+            raise ValueError(f"No history of {self.data_file} as of {when}; {reason}")
+        return data
+    
+    def past(self, when: str) -> GuildManager:
+        """The guild as it was at when, read-only (raises ValueError if its history doesn't reach back then)"""
+        return GuildManager(self.data_file, self.storage.backend, when)
     
     def save_data(self):
         """Save guild data to JSON file"""
-        self.data["last_updated"] = datetime.now().isoformat()
+        if self._batch_depth:
+            return  # written once when the batch ends
+        self._write_data()
+    
+    @contextlib.contextmanager
+    def batch(self):
+        """Group several commands into a single save at the end"""
+        self._batch_depth += 1
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-            print(f"[+] Guild data saved to {self.data_file}")
+            yield
+        finally:
+            self._batch_depth -= 1
+        if not self._batch_depth:
+            self.flush()
+    
+    def flush(self):
+        """Save changes held back by batch() now"""
+        if self._changes:
+            self._write_data()
+    
+    def _write_data(self):
+        with phase("save"):
+            if self.storage.transactional:
+                # SQLite keeps other writers out from our first change until the commit
+                saved = self._save()
+                snapshot = saved and self._after_save(saved, self.version, take_lock=True)
+            else:
+                # Other processes may have saved since we loaded; the lock is
+                # only held to check for that and write, never while a command runs.
+                with self.lock:
+                    saved = self._save()
+                    snapshot = saved and self._after_save(saved, self.version)
+        if snapshot:
+            # Copied from the files just saved, now that other writers can go ahead
+            with phase("history"):
+                try:
+                    self.history().take_snapshot(snapshot)
+                except Exception as e:
+                    print(f"Warning: could not take a history snapshot: {e}")
+    
+    def _save(self) -> List[Dict[str, Any]]:
+        """Write the pending changes to storage, after their archive entries
+
+        Returns the changes saved, or None (they stay pending) if the guild
+        could not be written. Called with the lock held for file backends.
+        """
+        try:
+            if self.storage.transactional:
+                self._apply("set", ["last_updated"], value=_now())
+                self._append_archives(take_lock=True)
+                self.storage.save(self.data, self._changes)
+                version = self.data["version"]
+            else:
+                if self.lock.read_version() != self.version:
+                    self._reapply_changes()
+                self._apply("set", ["last_updated"], value=_now())
+                self._apply("set", ["version"], value=self.version + 1)
+                self._append_archives()
+                self.storage.save(self.data, self._changes)
+                self.lock.write_version(self.version + 1)
+                version = self.version + 1
         except IOError as e:
             print(f"Error saving data: {e}")
+            return None
+        saved = self._changes
+        self._changes = []
+        self._archived_upto = 0
+        self.version = version
+        print(f"[+] Guild data saved to {self.data_file}")
+        return saved
+    
+    def _after_save(self, changes: List[Dict[str, Any]], version: int, take_lock: bool = False):
+        """Bring the search log and the history up to date with a save that went through
+
+        Both only derive from the saved guild, so a failure here is a warning:
+        failing the save would leave its changes pending, to be applied twice.
+        Returns the snapshot to take once the lock is released, if any.
+        """
+        try:
+            self._log_search_changes(changes, version, take_lock)
+        except OSError as e:
+            print(f"Warning: could not note this save for the search index, which will be rebuilt: {e}")
+        try:
+            return self._record_history(changes, version, take_lock)
+        except Exception as e:
+            print(f"Warning: could not record this save in the history: {e}")
+            return None
+    
+    def _log_search_changes(self, changes: List[Dict[str, Any]], version: int, take_lock: bool = False):
+        """Note the records a save touched for the search index file, if there is one"""
+        index_file = self.data_file + ".search"
+        if not os.path.exists(index_file):
+            return
+        from guild_search import log_changes
+        with self.lock if take_lock else contextlib.nullcontext():
+            try:
+                log_changes(index_file, version, changes)
+            except OSError:
+                # The index file can't catch up on a save it has no entry for; drop it so the next search rebuilds
+                with contextlib.suppress(OSError):
+                    os.remove(index_file)
+                raise
+    
+    def announcement_archive(self):
+        """The archive of every announcement posted, in ``<data_file>.announcements/``"""
+        from guild_archive import SegmentArchive
+        return SegmentArchive(self.data_file + ".announcements", "date",
+                              getattr(self.storage, "durability", "safe"))
+    
+    def quest_archive(self):
+        """The cold archive of completed quests moved out of the guild, in ``<data_file>.quests/``"""
+        from guild_archive import SegmentArchive
+        return SegmentArchive(self.data_file + ".quests", "completed_date",
+                              getattr(self.storage, "durability", "safe"), compress=True)
+    
+    def _append_archives(self, take_lock: bool = False):
+        """Append the quests this save moves out of the guild, and the announcements and ledger entries it posts, to their archives
+        
+        Done before the data is written: a crash in between leaves an entry
+        in both places (archived_quests() shows a quest once), never in
+        neither. A save that is retried after failing doesn't append its
+        entries again.
+        """
+        pending = self._changes[self._archived_upto:]
+        moved = [change["archived"] for change in pending if "archived" in change]
+        posted = [change["value"] for change in pending
+                  if change["op"] == "push" and change["path"] == ["announcements"]]
+        entries = [change["entry"] for change in pending if "entry" in change]
+        if moved or posted or entries:
+            with self.lock if take_lock else contextlib.nullcontext():
+                if moved:
+                    self.quest_archive().append(moved)
+                if posted:
+                    archive = self.announcement_archive()
+                    if not archive.exists():
+                        # Start the history with the announcements posted before there was an archive
+                        earlier = [announcement for announcement in self.data["announcements"]
+                                   if not any(announcement is value for value in posted)]
+                        posted = earlier[::-1] + posted
+                    archive.append(posted)
+                if entries:
+                    self.ledger().append(entries)
+        self._archived_upto = len(self._changes)
+    
+    def _record_history(self, changes: List[Dict[str, Any]], version: int, take_lock: bool = False):
+        """Keep a save's changes in the history, for --as-of, if the guild keeps one
+
+        Returns the snapshot to take once the lock is released, if this save
+        needs one (see GuildHistory.record).
+        """
+        keep = self.data.get("history", False)
+        if not keep and not any(change["path"] == ["history"] for change in changes):
+            return None
+        # Stamped with the save's own time, so --as-of agrees with last_updated
+        saved_at = self.data["last_updated"]
+        with phase("history"):
+            with self.lock if take_lock else contextlib.nullcontext():
+                if not keep:
+                    self.history().stop(version, saved_at)
+                    return None
+                return self.history().record(self.storage, changes, version, saved_at)
+    
+    def _reapply_changes(self):
+        """Reload the latest guild data and redo our pending changes on top of it"""
+        changes, archived_upto = self._changes, self._archived_upto
+        self.data = self.load_data()
+        for change in changes:
+            apply_change(self.data, change)
+        self._changes, self._archived_upto = changes, archived_upto
+        print("[+] Guild data was changed by another process; applied your changes to the latest version")
+    
+    def compact(self):
+        """Fold the journal back into the data file and rewrite every collection"""
+        self.flush()
+        if self.storage.transactional:
+            self.storage.compact(self.data)
+        else:
+            with self.lock:
+                if self.lock.read_version() != self.version:
+                    self.data = self.load_data()
+                self.storage.compact(self.data)
+        print(f"[+] Compacted {self.data_file}")
+    
+    def convert(self, output_file: str, backend: str = None, **storage_options):
+        """Copy the guild into another data file, converting between storage backends and formats"""
+        target = open_storage(output_file, backend, **storage_options)
+        target.replace(self.data)
+        print(f"[+] Converted {self.data_file} to {output_file}")
+    
+    def _apply(self, op: str, path: List[str], **fields):
+        """Apply a change to the guild data and queue it for the next save"""
+        if self.as_of is not None:
+            raise ValueError(f"The guild is shown as of {self.as_of} and can't be changed")
+        if not self._changes:
+            self.storage.begin()
+        change = {"op": op, "path": path}
+        change.update(fields)
+        # Keep the listing and name indexes in step with the records the change touches
+        touched = []
+        for indexes in (self._indexes, self._names):
+            index = indexes.get(path[0])
+            if index is None:
+                continue
+            keys = index.keys_of(change)
+            if keys is None:
+                del indexes[path[0]]  # rebuilt when next needed
+            else:
+                touched.append((index, keys))
+        with phase("mutate"):
+            for index, keys in touched:
+                for key in keys:
+                    index.remove(key)
+            apply_change(self.data, change)
+            for index, keys in touched:
+                for key in keys:
+                    index.add(key)
+            if self._search is not None:
+                from guild_search import touched_documents
+                self._search.update(self.data, touched_documents(change))
+        self._changes.append(change)
+    
+    def query(self, collection: str, match: Dict[str, Any] = None, low=None, high=None,
+              sort: str = None, descending: bool = False, limit: int = None) -> List[Any]:
+        """Return (id, record) pairs of members or quests that match, via the secondary indexes
+
+        ``match`` maps fields to required values (case doesn't matter),
+        ``low``/``high`` bound the member level, ``sort`` is a record field.
+        The first query of a collection is answered with one pass over it,
+        which is cheaper than indexing for a one-off command; from the second
+        on (menu, batch, daemon) the indexes are built and kept up to date
+        by _apply(). The SQLite backend answers with its own table indexes.
+        """
+        records = self.data[collection]
+        if hasattr(records, "query"):
+            return records.query(match, low, high, sort, descending, limit)
+        if collection not in self._indexes:
+            from guild_index import scan
+            self._indexes[collection] = None  # index it if it's asked again
+            return scan(collection, records, match, low, high, sort, descending, limit)
+        index = self._indexes[collection]
+        if index is None:
+            from guild_index import CollectionIndex
+            index = self._indexes[collection] = CollectionIndex(collection, records)
+        return index.query(match, low, high, sort, descending, limit)
+    
+    def name_index(self, collection: str):
+        """The trigram index of member names or quest titles, built on first use"""
+        index = self._names.get(collection)
+        if index is None:
+            from guild_index import NameIndex
+            index = self._names[collection] = NameIndex(collection, self.data[collection])
+        return index
+    
+    def suggest(self, collection: str, text: str, limit: int = 3) -> List[str]:
+        """Member names or quest titles spelled most like text, best first"""
+        records = self.data[collection]
+        return [records[key][NAME_FIELDS[collection]] for key in self.name_index(collection).suggest(text, limit)]
+    
+    def _did_you_mean(self, collection: str, text: str):
+        suggestions = self.suggest(collection, text)
+        if suggestions:
+            print(f"   Did you mean: {', '.join(suggestions)}?")
     
     def add_member(self, name: str, character_class: str, level: int = 1, description: str = ""):
         """Add a new guild member"""
         member_id = name.lower().replace(" ", "_")
-        self.data["members"][member_id] = {
+        self._apply("set", ["members", member_id], value={
             "name": name,
             "class": character_class,
             "level": level,
             "description": description,
             "status": "active",
-            "joined_date": datetime.now().isoformat()
-        }
+            "joined_date": _now()
+        })
         self.save_data()
         print(f"[+] Added {name} (Level {level} {character_class}) to the guild!")
     
@@ -68,20 +371,32 @@ class GuildManager:
         """Remove a guild member"""
         member_id = name.lower().replace(" ", "_")
         if member_id in self.data["members"]:
-            removed_member = self.data["members"].pop(member_id)
+            removed_member = self.data["members"][member_id]
+            self._apply("del", ["members", member_id])
             self.save_data()
             print(f"[+] Removed {removed_member['name']} from the guild.")
         else:
             print(f"[-] Member '{name}' not found.")
+            self._did_you_mean("members", name)
     
-    def list_members(self):
-        """List all guild members"""
+    def list_members(self, character_class: str = None, status: str = None, min_level: int = None,
+                     max_level: int = None, sort: str = None, descending: bool = False, limit: int = None):
+        """List guild members, optionally filtered, sorted (by a SORT_FIELDS name) and limited"""
         if not self.data["members"]:
             print("No guild members found.")
             return
         
+        members = self.data["members"].values()
+        match = {field: value for field, value in (("class", character_class), ("status", status)) if value}
+        if match or min_level is not None or max_level is not None or sort or descending or limit is not None:
+            members = [member for _, member in self.query(
+                "members", match, min_level, max_level, SORT_FIELDS["members"].get(sort), descending, limit)]
+            if not members:
+                print("No matching members found.")
+                return
+        
         print("\n=== Guild Members ===")
-        for member in self.data["members"].values():
+        for member in members:
             status_icon = "[ACTIVE]" if member["status"] == "active" else "[INACTIVE]"
             print(f"{status_icon} {member['name']} - Level {member['level']} {member['class']}")
             if member.get("description"):
@@ -90,14 +405,14 @@ class GuildManager:
     def add_quest(self, title: str, description: str, reward: str = "", difficulty: str = "Normal"):
         """Add a new quest"""
         quest_id = title.lower().replace(" ", "_")
-        self.data["quests"][quest_id] = {
+        self._apply("set", ["quests", quest_id], value={
             "title": title,
             "description": description,
             "reward": reward,
             "difficulty": difficulty,
             "status": "available",
-            "created_date": datetime.now().isoformat()
-        }
+            "created_date": _now()
+        })
         self.save_data()
         print(f"[+] Added quest: {title}")
     
@@ -105,85 +420,438 @@ class GuildManager:
         """Mark a quest as completed"""
         quest_id = title.lower().replace(" ", "_")
         if quest_id in self.data["quests"]:
-            self.data["quests"][quest_id]["status"] = "completed"
-            self.data["quests"][quest_id]["completed_date"] = datetime.now().isoformat()
+            quest = dict(self.data["quests"][quest_id])
+            quest["status"] = "completed"
+            quest["completed_date"] = _now()
+            self._apply("set", ["quests", quest_id], value=quest)
+            # Quests completed long enough ago leave the working set with this save
+            if self.archive_days() is not None:
+                self.archive_quests(quiet=True)
             self.save_data()
             print(f"[+] Quest '{title}' marked as completed!")
         else:
             print(f"[-] Quest '{title}' not found.")
+            self._did_you_mean("quests", title)
+    
+    def archive_days(self) -> int:
+        """Days after completion before quest complete moves a quest to the archive (None: never)"""
+        return self.data.get("quest_archive_days", ARCHIVE_AFTER_DAYS)
+    
+    def archive_quests(self, older_than: int = None, quiet: bool = False) -> int:
+        """Move quests completed more than older_than days ago (default: the guild's setting) to the archive
+        
+        Returns how many moved; they are written on the next save.
+        """
+        from datetime import datetime, timedelta
+        if older_than is None:
+            older_than = self.archive_days()
+            if older_than is None:
+                older_than = ARCHIVE_AFTER_DAYS
+        cutoff = (datetime.now() - timedelta(days=older_than)).isoformat()
+        old = [(key, quest) for key, quest in self.query("quests", {"status": "completed"})
+               if (quest.get("completed_date") or "") <= cutoff]
+        for key, quest in old:
+            self._apply("del", ["quests", key], archived=dict(quest, id=key))
+        if old or not quiet:
+            print(f"[+] Archived {len(old)} quest(s) completed more than {older_than} day(s) ago")
+        return len(old)
+    
+    def archived_quests(self, since: str = None, until: str = None, difficulty: str = None,
+                        limit: int = None) -> List[Any]:
+        """Archived quests completed between since and until, most recently completed first"""
+        from guild_archive import check_time_bound
+        from guild_index import match_key
+        since = check_time_bound(since) if since else None
+        until = check_time_bound(until) if until else None
+        # The difficulty filter is applied after reading, so the archive can't stop at the limit
+        entries = self.quest_archive().range(since, until, None if difficulty else limit)
+        found = []
+        # A crash between archiving and saving archives a quest again on the next
+        # save; recurring quests share an id but not their completion time
+        seen = set()
+        for quest in entries:
+            completion = (quest["id"], quest.get("completed_date"))
+            if completion in seen or (difficulty and match_key(quest.get("difficulty")) != match_key(difficulty)):
+                continue
+            seen.add(completion)
+            found.append(quest)
+        return found[:limit]
+    
+    def list_archived_quests(self, since: str = None, until: str = None, difficulty: str = None,
+                             limit: int = None):
+        """List archived quests, most recently completed first"""
+        try:
+            quests = self.archived_quests(since, until, difficulty, limit)
+        except ValueError as e:
+            print(f"[-] {e}")
+            return
+        if not quests:
+            print("No archived quests found.")
+            return
+        print("\n=== Archived Quests ===")
+        for quest in quests:
+            print(f"[COMPLETED {quest['completed_date'][:10]}] {quest['title']} ({quest['difficulty']})")
+            print(f"   {quest['description']}")
+            if quest.get("reward"):
+                print(f"   Reward: {quest['reward']}")
     
-    def list_quests(self):
-        """List all quests"""
+    def list_quests(self, status: str = None, difficulty: str = None, sort: str = None,
+                    descending: bool = False, limit: int = None):
+        """List quests, optionally filtered, sorted (by a SORT_FIELDS name) and limited"""
         if not self.data["quests"]:
             print("No quests found.")
             return
         
+        quests = self.data["quests"].values()
+        match = {field: value for field, value in (("status", status), ("difficulty", difficulty)) if value}
+        if match or sort or descending or limit is not None:
+            quests = [quest for _, quest in self.query(
+                "quests", match, sort=SORT_FIELDS["quests"].get(sort), descending=descending, limit=limit)]
+            if not quests:
+                print("No matching quests found.")
+                return
+        
         print("\n=== Guild Quests ===")
-        for quest in self.data["quests"].values():
+        for quest in quests:
             status_icon = "[AVAILABLE]" if quest["status"] == "available" else "[COMPLETED]"
             print(f"{status_icon} {quest['title']} ({quest['difficulty']})")
             print(f"   {quest['description']}")
             if quest.get("reward"):
                 print(f"   Reward: {quest['reward']}")
     
-    def update_resources(self, gold: int = None, item_name: str = None, item_quantity: int = None):
-        """Update guild resources"""
+    def update_resources(self, gold: int = None, item_name: str = None, item_quantity: int = None,
+                         reason: str = None, member: str = None, quest: str = None):
+        """Update guild resources, keeping each movement in the ledger (with an optional reason, member and quest)"""
         if gold is not None:
-            self.data["resources"]["gold"] += gold
+            self._apply("incr", ["resources", "gold"], delta=gold)
+            self._add_ledger_entry(gold=gold, reason=reason, member=member, quest=quest)
             action = "added" if gold > 0 else "spent"
             print(f"[+] {action.title()} {abs(gold)} gold. Current total: {self.data['resources']['gold']}")
         
         if item_name and item_quantity is not None:
-            if item_name not in self.data["resources"]["items"]:
-                self.data["resources"]["items"][item_name] = 0
-            self.data["resources"]["items"][item_name] += item_quantity
+            before = self.data["resources"]["items"].get(item_name, 0)
+            self._apply("incr", ["resources", "items", item_name], delta=item_quantity, prune=True)
+            # Removing more than there is only takes what there was
+            moved = self.data["resources"]["items"].get(item_name, 0) - before
+            self._add_ledger_entry(item=item_name, quantity=moved, reason=reason, member=member, quest=quest)
             
-            if self.data["resources"]["items"][item_name] <= 0:
-                del self.data["resources"]["items"][item_name]
+            if item_name not in self.data["resources"]["items"]:
                 print(f"[+] Removed {item_name} from inventory")
             else:
                 print(f"[+] Updated {item_name}: {self.data['resources']['items'][item_name]}")
         
         self.save_data()
     
+    def _add_ledger_entry(self, **fields):
+        """Record the movement of gold or items just applied, and add it to the day and week totals
+
+        The entry rides on the movement's change record and is appended to
+        the ledger when that change is saved.
+        """
+        from guild_ledger import ledger_entry, rollup_deltas
+        entry = ledger_entry(_now(), **fields)
+        self._changes[-1]["entry"] = entry
+        for path, delta in rollup_deltas(entry):
+            self._apply("incr", path, delta=delta)
+    
+    def ledger(self):
+        """The archive of every gold and item movement, in ``<data_file>.ledger/``"""
+        from guild_archive import SegmentArchive
+        return SegmentArchive(self.data_file + ".ledger", "time", getattr(self.storage, "durability", "safe"))
+    
+    def resource_balance(self):
+        """Print current gold and items with today's and this week's totals, straight from the rollups"""
+        from guild_ledger import totals_for
+        resources = self.data["resources"]
+        now = _now()
+        print("\n=== Guild Balance ===")
+        print(f"Gold: {resources['gold']}")
+        print(f"Item kinds: {len(resources['items'])}, total items: {sum(resources['items'].values())}")
+        for label, period in (("Today", "day"), ("This week", "week")):
+            totals = totals_for(self.data, period, now)
+            print(f"{label}: +{totals.get('gold_in', 0)} / -{totals.get('gold_out', 0)} gold "
+                  f"in {totals.get('entries', 0)} movements")
+    
+    def resource_report(self, period: str = "day", since: str = None, until: str = None, limit: int = None):
+        """Print gold and item totals per day or week, newest first"""
+        from guild_archive import check_time_bound
+        from guild_ledger import report
+        try:
+            since = check_time_bound(since) if since else None
+            until = check_time_bound(until) if until else None
+        except ValueError as e:
+            print(f"[-] {e}")
+            return
+        rows = report(self.data, period, since, until, limit)
+        if not rows:
+            print("No resource movements found.")
+            return
+        print(f"\n=== Resources by {period} ===")
+        print(f"{'Week of' if period == 'week' else 'Day':<12} {'Gold in':>9} {'Gold out':>9} {'Net':>9} {'Moves':>6}  Items")
+        for start, totals in rows:
+            gold_in, gold_out = totals.get("gold_in", 0), totals.get("gold_out", 0)
+            items = ", ".join(f"{name} {quantity:+d}" for name, quantity in totals.get("items", {}).items() if quantity)
+            print(f"{start:<12} {gold_in:>9} {gold_out:>9} {gold_in - gold_out:>+9} {totals.get('entries', 0):>6}  {items}")
+    
+    def resource_ledger(self, since: str = None, until: str = None, limit: int = None):
+        """Print ledger entries, newest first, optionally between two dates or times"""
+        from guild_archive import check_time_bound
+        from guild_ledger import describe
+        try:
+            since = check_time_bound(since) if since else None
+            until = check_time_bound(until) if until else None
+        except ValueError as e:
+            print(f"[-] {e}")
+            return
+        entries = self.ledger().range(since, until, limit)
+        if not entries:
+            print("No ledger entries found.")
+            return
+        print("\n=== Resource Ledger ===")
+        for entry in entries:
+            print(f"[{entry['time'][:19].replace('T', ' ')}] {describe(entry)}")
+    
+    def show_resources(self):
+        """Print the guild's gold and inventory"""
+        resources = self.data["resources"]
+        print("\n=== Guild Resources ===")
+        print(f"Gold: {resources['gold']}")
+        if resources["items"]:
+            print("Inventory:")
+            for item, quantity in resources["items"].items():
+                print(f"   {item}: {quantity}")
+        else:
+            print("Inventory: Empty")
+    
     def add_announcement(self, message: str):
         """Add a guild announcement"""
         announcement = {
             "message": message,
-            "date": datetime.now().isoformat()
+            "date": _now()
         }
-        self.data["announcements"].insert(0, announcement)  # Most recent first
-        
-        # Keep only the last 10 announcements
-        self.data["announcements"] = self.data["announcements"][:10]
+        # Most recent first, keeping only the last few for the web page; the archive has them all
+        self._apply("push", ["announcements"], value=announcement, keep=HOT_ANNOUNCEMENTS)
         self.save_data()
         print(f"[+] Added announcement: {message}")
     
-    def set_guild_info(self, name: str = None, description: str = None):
-        """Update guild information"""
+    def announcement_history(self, since: str = None, until: str = None, limit: int = None):
+        """List archived announcements, newest first, optionally between two dates or times"""
+        from guild_archive import check_time_bound, in_range
+        try:
+            since = check_time_bound(since) if since else None
+            until = check_time_bound(until) if until else None
+        except ValueError as e:
+            print(f"[-] {e}")
+            return
+        
+        archive = self.announcement_archive()
+        if archive.exists():
+            announcements = archive.range(since, until, limit)
+        else:
+            # Nothing posted since the archive was introduced; the recent list is the whole history
+            announcements = [announcement for announcement in self.data["announcements"]
+                             if in_range(announcement["date"], since, until)][:limit]
+        if not announcements:
+            print("No announcements found.")
+            return
+        
+        print("\n=== Announcement History ===")
+        for announcement in announcements:
+            print(f"[{announcement['date'][:19].replace('T', ' ')}] {announcement['message']}")
+    
+    def set_guild_info(self, name: str = None, description: str = None, archive_after: int = None,
+                       history: bool = None):
+        """Update guild information, after how many days completed quests are archived (negative: never)
+        and whether a history is kept for --as-of"""
+        if archive_after is not None:
+            self._apply("set", ["quest_archive_days"], value=archive_after if archive_after >= 0 else None)
+            print(f"[+] Completed quests archived after {archive_after} day(s)" if archive_after >= 0
+                  else "[+] Completed quests are only archived by 'quest archive'")
+        if history is not None:
+            self._apply("set", ["history"], value=history)
+            print("[+] History kept from now on, for --as-of" if history
+                  else "[+] History no longer kept; --as-of can still show the times it was")
         if name:
-            self.data["guild_name"] = name
+            self._apply("set", ["guild_name"], value=name)
             print(f"[+] Guild name set to: {name}")
         if description:
-            self.data["guild_description"] = description
+            self._apply("set", ["guild_description"], value=description)
             print(f"[+] Guild description updated")
         self.save_data()
     
-    def generate_webpage(self, output_file="guild_page.html"):
-        """Generate HTML webpage for party members"""
+    def import_file(self, path: str, kind: str, input_format: str = None, chunk_size: int = 1000):
+        """Import members, quests or items from a CSV or JSONL file with a single save"""
+        from guild_import import ImportReport, read_records
+        report = ImportReport()
+        chunk = {}
+        for key, value in read_records(path, kind, input_format, report):
+            if kind == "items":
+                items = self.data["resources"]["items"]
+                before = items.get(key, 0)
+                self._apply("incr", ["resources", "items", key], delta=value, prune=True)
+                self._add_ledger_entry(item=key, quantity=items.get(key, 0) - before, reason="import")
+                continue
+            # Records are merged in chunks, so memory stays bounded by the chunk size
+            chunk[key] = value
+            if len(chunk) >= chunk_size:
+                self._apply("merge", [kind], value=chunk)
+                chunk = {}
+        if chunk:
+            self._apply("merge", [kind], value=chunk)
+        
+        if report.imported:
+            self.save_data()
+        source = "stdin" if path == "-" else path
+        print(f"[+] Imported {report.imported} {kind} from {source} ({report.rejected} rejected)")
+        for line_number, reason in report.details:
+            print(f"   line {line_number}: {reason}")
+        if report.rejected > len(report.details):
+            print(f"   ... and {report.rejected - len(report.details)} more")
+        return report
+    
+    def search_index(self, rebuild: bool = False):
+        """The full-text search index, loaded from ``<data_file>.search`` (or built) on first use"""
+        if self._search is None or rebuild:
+            from guild_search import SearchIndex, load_index, save_index
+            index_file = self.data_file + ".search"
+            with phase("index"):
+                if rebuild:
+                    self._search = SearchIndex.build(self.data, self.version)
+                    if not self._changes:
+                        save_index(index_file, self._search, self.lock)
+                else:
+                    self._search = load_index(index_file, self.data, self.version, self.lock,
+                                              persist=not self._changes)
+        return self._search
+    
+    def search(self, query: str, collections: List[str] = None, limit: int = 20, rebuild: bool = False):
+        """Full-text search of member descriptions, quest text and announcements, best matches first
+
+        Words must all appear; a word ending in * matches any word it starts.
+        """
+        from guild_search import split_document_id
+        results = self.search_index(rebuild).search(query, collections, limit)
+        if not results:
+            print(f"No results for '{query}'.")
+            return results
+        
+        print(f"\n=== Search: {query} ===")
+        for _, doc in results:
+            collection, key = split_document_id(doc)
+            if collection == "members":
+                member = self.data["members"][key]
+                print(f"[MEMBER] {member['name']} - Level {member['level']} {member['class']}")
+                print(f"   {member['description']}")
+            elif collection == "quests":
+                quest = self.data["quests"][key]
+                print(f"[QUEST] {quest['title']} ({quest['difficulty']}, {quest['status']})")
+                print(f"   {quest['description']}")
+                if quest.get("reward"):
+                    print(f"   Reward: {quest['reward']}")
+            else:
+                announcement = self.data["announcements"][int(key)]
+                print(f"[ANNOUNCEMENT] {announcement['date'][:10]}: {announcement['message']}")
+        return results
+    
+    def export(self, kind: str, output: str = "-", output_format: str = None, fields: str = None,
+               match: Dict[str, Any] = None, low: int = None, high: int = None, sort: str = None,
+               descending: bool = False, limit: int = None, header: bool = True):
+        """Stream members, quests, items or announcements to a CSV, TSV or JSONL file ("-" for stdout)
+
+        Takes the listing filters for members and quests, with ``sort`` as a
+        SORT_FIELDS name. Progress goes to stderr when exporting to stdout.
+        """
+        from guild_export import detect_format, export_records, open_output, parse_fields, write_records
+        from guild_index import INDEXED_FIELDS
+        report = sys.stderr if output == "-" else sys.stdout
+        match_fields, ranged = INDEXED_FIELDS.get(kind, ((), None))
+        unsupported = [field for field in (match or {}) if field not in match_fields]
+        if (low is not None or high is not None) and ranged is None:
+            unsupported.append("level")
+        if sort is not None and sort not in SORT_FIELDS.get(kind, {}):
+            unsupported.append(f"sorting by {sort}")
+        if unsupported:
+            print(f"[-] {kind.title()} can't be filtered or sorted by {', '.join(unsupported)}", file=report)
+            return 0
+        try:
+            selected = parse_fields(kind, fields)
+        except ValueError as e:
+            print(f"[-] {e}", file=report)
+            return 0
+        if output_format is None:
+            output_format = "csv" if output == "-" else detect_format(output)
+        
+        records = export_records(self, kind, match, low, high, SORT_FIELDS.get(kind, {}).get(sort), descending, limit)
+        f = open_output(output)
+        try:
+            with phase("write"):
+                count = write_records(f, records, kind, selected, output_format, header)
+        finally:
+            if f is sys.stdout:
+                f.flush()
+            else:
+                f.close()
+        print(f"[+] Exported {count} {kind} to {'stdout' if output == '-' else output} ({output_format})", file=report)
+        return count
+    
+    def generate_webpage(self, output_file="guild_page.html", archived: bool = False):
+        """Generate HTML webpage for party members, with archived quests among the completed ones if asked"""
         from web_generator import generate_guild_webpage
-        generate_guild_webpage(self.data, output_file)
+        archived_quests = self.archived_quests() if archived else ()
+        generate_guild_webpage(self.data, output_file, archived_quests)
         print(f"[+] Generated webpage: {output_file}")
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Fantasy Guild Manager CLI")
-    parser.add_argument("--data", default="guild_data.json", help="Guild data file")
-    
-    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+# Commands that start a session of their own and can't run inside one
+SESSION_COMMANDS = ["batch", "serve-daemon"]
+
+
+# Why a command line with --as-of was refused
+AS_OF_COMMANDS = ("--as-of only works with member list, quest list, resource (without changes), "
+                  "resource balance/report, web and export")
+
+
+def reads_only(args: argparse.Namespace) -> bool:
+    """Whether a parsed command only reads guild data, so it can run --as-of a past time"""
+    if args.command == "member":
+        return args.member_action == "list"
+    if args.command == "quest":
+        return args.quest_action == "list" and not args.archived
+    if args.command == "resource":
+        if args.resource_action is not None:
+            return args.resource_action != "ledger"
+        return args.gold is None and args.item is None and args.quantity is None
+    if args.command == "web":
+        return not args.archived
+    return args.command == "export"
+
+
+class CommandError(Exception):
+    """A command line that could not be parsed"""
+
+
+class CommandParser(argparse.ArgumentParser):
+    """Argument parser that raises CommandError instead of exiting, for batch lines"""
     
-    # Member commands
-    member_parser = subparsers.add_parser("member", help="Manage guild members")
+    def error(self, message):
+        raise CommandError(message)
+
+
+def non_negative(value: str) -> int:
+    """argparse type for counts such as --limit: a whole number, 0 or more"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {number}")
+    return number
+
+
+def _listing_arguments(list_parser, collection: str):
+    list_parser.add_argument("--sort", choices=list(SORT_FIELDS[collection]), help="Sort by this field")
+    list_parser.add_argument("--desc", action="store_true", help="Sort in descending order")
+    list_parser.add_argument("--limit", type=non_negative, help="Show at most this many")
+
+
+def _member_arguments(member_parser):
     member_subparsers = member_parser.add_subparsers(dest="member_action")
     
     add_member_parser = member_subparsers.add_parser("add", help="Add a new member")
@@ -195,10 +863,15 @@ def main():
     remove_member_parser = member_subparsers.add_parser("remove", help="Remove a member")
     remove_member_parser.add_argument("name", help="Member name")
     
-    member_subparsers.add_parser("list", help="List all members")
-    
-    # Quest commands
-    quest_parser = subparsers.add_parser("quest", help="Manage quests")
+    list_member_parser = member_subparsers.add_parser("list", help="List members")
+    list_member_parser.add_argument("--class", dest="character_class", help="Only members of this class")
+    list_member_parser.add_argument("--status", help="Only members with this status (active, inactive)")
+    list_member_parser.add_argument("--min-level", type=int, help="Only members of at least this level")
+    list_member_parser.add_argument("--max-level", type=int, help="Only members of at most this level")
+    _listing_arguments(list_member_parser, "members")
+
+
+def _quest_arguments(quest_parser):
     quest_subparsers = quest_parser.add_subparsers(dest="quest_action")
     
     add_quest_parser = quest_subparsers.add_parser("add", help="Add a new quest")
@@ -210,63 +883,396 @@ def main():
     complete_quest_parser = quest_subparsers.add_parser("complete", help="Complete a quest")
     complete_quest_parser.add_argument("title", help="Quest title")
     
-    quest_subparsers.add_parser("list", help="List all quests")
+    list_quest_parser = quest_subparsers.add_parser("list", help="List quests")
+    list_quest_parser.add_argument("--status", help="Only quests with this status (available, completed)")
+    list_quest_parser.add_argument("--difficulty", help="Only quests of this difficulty")
+    list_quest_parser.add_argument("--archived", action="store_true",
+                                   help="List archived quests instead, most recently completed first")
+    list_quest_parser.add_argument("--since", help="Archived: only quests completed from this date or time on")
+    list_quest_parser.add_argument("--until", help="Archived: only quests completed up to this date or time")
+    _listing_arguments(list_quest_parser, "quests")
     
-    # Resource commands
-    resource_parser = subparsers.add_parser("resource", help="Manage resources")
+    archive_quest_parser = quest_subparsers.add_parser(
+        "archive", help="Move completed quests to the compressed archive")
+    archive_quest_parser.add_argument("--older-than", type=int, metavar="DAYS",
+                                      help="Only quests completed more than DAYS ago "
+                                           f"(default: the guild's setting, {ARCHIVE_AFTER_DAYS} unless changed)")
+
+
+def _resource_arguments(resource_parser):
     resource_parser.add_argument("--gold", type=int, help="Add/remove gold")
     resource_parser.add_argument("--item", help="Item name")
     resource_parser.add_argument("--quantity", type=int, help="Item quantity")
+    resource_parser.add_argument("--reason", help="Why the gold or items moved, for the ledger")
+    resource_parser.add_argument("--member", help="Member the movement concerns, for the ledger")
+    resource_parser.add_argument("--quest", help="Quest the movement concerns, for the ledger")
+    
+    resource_subparsers = resource_parser.add_subparsers(dest="resource_action")
+    resource_subparsers.add_parser("balance", help="Show gold, items and today's and this week's totals")
     
-    # Announcement commands
-    announce_parser = subparsers.add_parser("announce", help="Add announcement")
-    announce_parser.add_argument("message", help="Announcement message")
+    report_parser = resource_subparsers.add_parser("report", help="Show gold and item totals per day or week")
+    period = report_parser.add_mutually_exclusive_group()
+    period.add_argument("--by-day", dest="period", action="store_const", const="day", default="day",
+                        help="One line per day (default)")
+    period.add_argument("--by-week", dest="period", action="store_const", const="week", help="One line per week")
     
-    # Guild info commands
-    info_parser = subparsers.add_parser("info", help="Set guild information")
+    ledger_parser = resource_subparsers.add_parser("ledger", help="List gold and item movements")
+    for range_parser in (report_parser, ledger_parser):
+        range_parser.add_argument("--since", help="From this date or time on (e.g. 2026-10-01)")
+        range_parser.add_argument("--until", help="Up to this date or time (inclusive)")
+        range_parser.add_argument("--limit", type=non_negative, help="Show at most this many")
+
+
+def _announce_arguments(announce_parser):
+    announce_parser.add_argument("message", help="Announcement message, or 'history' to list past announcements")
+    announce_parser.add_argument("--since", help="History: only announcements from this date or time on (e.g. 2026-10-01)")
+    announce_parser.add_argument("--until", help="History: only announcements up to this date or time (inclusive)")
+    announce_parser.add_argument("--limit", type=non_negative, help="History: show at most this many")
+
+
+def _info_arguments(info_parser):
     info_parser.add_argument("--name", help="Guild name")
     info_parser.add_argument("--description", help="Guild description")
-    
-    # Web generation
-    web_parser = subparsers.add_parser("web", help="Generate webpage")
+    info_parser.add_argument("--archive-after", type=int, metavar="DAYS",
+                             help="Archive quests this many days after completion (-1: only by 'quest archive')")
+    info_parser.add_argument("--history", choices=["on", "off"],
+                             help="Keep a history of every save, so --as-of can show the guild as it was")
+
+
+def _web_arguments(web_parser):
     web_parser.add_argument("--output", default="guild_page.html", help="Output HTML file")
+    web_parser.add_argument("--archived", action="store_true", help="Also show archived quests")
+
+
+def _import_arguments(import_parser):
+    from guild_import import IMPORT_FORMATS, IMPORT_KINDS
+    import_parser.add_argument("kind", choices=IMPORT_KINDS, help="What the file contains")
+    import_parser.add_argument("file", help="CSV or JSONL file to import ('-' reads stdin)")
+    import_parser.add_argument("--input-format", choices=IMPORT_FORMATS,
+                               help="Input format (detected from the file extension by default)")
+
+
+def _batch_arguments(batch_parser):
+    batch_parser.add_argument("file", nargs="?", default="-", help="File with one command per line (default: stdin)")
+    batch_parser.add_argument("--save-every", type=int, default=0,
+                              help="Also save after every N commands (default: only at the end)")
+
+
+def _daemon_arguments(daemon_parser):
+    daemon_parser.add_argument("--socket", help="Socket path (default: the data file name plus .sock)")
+    daemon_parser.add_argument("--commit-interval", type=float, default=10,
+                               help="Milliseconds to gather writes into one save (default: 10)")
+
+
+def _search_arguments(search_parser):
+    from guild_search import SEARCH_FIELDS
+    search_parser.add_argument("query", nargs="+", help="Words to look for (all must appear; end one with * for a prefix)")
+    search_parser.add_argument("--in", dest="collections", nargs="+", choices=list(SEARCH_FIELDS),
+                               help="Only search these (default: members, quests and announcements)")
+    search_parser.add_argument("--limit", type=non_negative, default=20, help="Show at most this many results (default: 20)")
+    search_parser.add_argument("--rebuild", action="store_true", help="Rebuild the search index from scratch first")
+
+
+def _export_arguments(export_parser):
+    from guild_export import EXPORT_FORMATS, EXPORT_KINDS
+    export_parser.add_argument("kind", choices=EXPORT_KINDS, help="What to export")
+    export_parser.add_argument("--output", default="-", help="File to write (default: stdout)")
+    export_parser.add_argument("--output-format", choices=EXPORT_FORMATS,
+                               help="Output format (detected from the file extension by default, csv on stdout)")
+    export_parser.add_argument("--fields", help="Comma-separated fields to export, in this order (default: all)")
+    export_parser.add_argument("--no-header", action="store_true", help="Leave out the CSV/TSV header row")
+    export_parser.add_argument("--class", dest="character_class", help="Only members of this class")
+    export_parser.add_argument("--status", help="Only members or quests with this status")
+    export_parser.add_argument("--difficulty", help="Only quests of this difficulty")
+    export_parser.add_argument("--min-level", type=int, help="Only members of at least this level")
+    export_parser.add_argument("--max-level", type=int, help="Only members of at most this level")
+    export_parser.add_argument("--sort", choices=list(dict.fromkeys(list(SORT_FIELDS["members"]) + list(SORT_FIELDS["quests"]))),
+                               help="Sort members by name, level or joined, quests by title or created")
+    export_parser.add_argument("--desc", action="store_true", help="Sort in descending order")
+    export_parser.add_argument("--limit", type=non_negative, help="Export at most this many")
+
+
+def _no_arguments(parser):
+    pass
+
+
+def _convert_arguments(convert_parser):
+    convert_parser.add_argument("output", help="Destination data file (e.g. guild.db or guild_data.json)")
+    convert_parser.add_argument("--output-backend", choices=BACKENDS,
+                                help="Destination storage backend (detected from the file name by default)")
+    convert_parser.add_argument("--output-format", choices=SNAPSHOT_FORMATS, default="pretty",
+                                help="Destination data file format for the json backend")
+    convert_parser.add_argument("--output-compress", choices=COMPRESSIONS,
+                                help="Destination compression (detected from the .gz/.xz extension by default)")
+
+
+# Subcommands: name -> (help, function adding its arguments)
+COMMANDS = {
+    "member": ("Manage guild members", _member_arguments),
+    "quest": ("Manage quests", _quest_arguments),
+    "resource": ("Manage resources", _resource_arguments),
+    "announce": ("Add an announcement, or list past ones with 'announce history'", _announce_arguments),
+    "info": ("Set guild information", _info_arguments),
+    "web": ("Generate webpage", _web_arguments),
+    "import": ("Import members, quests or items from a file", _import_arguments),
+    "search": ("Search member, quest and announcement text", _search_arguments),
+    "export": ("Export members, quests, items or announcements as CSV, TSV or JSONL", _export_arguments),
+    "batch": ("Run many commands from a file or stdin with one save", _batch_arguments),
+    "serve-daemon": ("Keep the guild loaded and serve commands on a Unix socket", _daemon_arguments),
+    "compact": ("Fold the journal into the data file and rewrite it", _no_arguments),
+    "convert": ("Copy the guild into another data file", _convert_arguments),
+}
+
+# Global options that take a value, for spotting the subcommand in argv
+_VALUE_OPTIONS = ["--data", "--backend", "--compact-after", "--format", "--compress",
+                  "--compress-level", "--durability", "--as-of", "--metrics-file", "--profile"]
+
+
+def find_command(argv: List[str]) -> str:
+    """Return the subcommand named in argv without parsing it fully (None if unclear)"""
+    args = iter(argv)
+    for arg in args:
+        if arg in _VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg if arg in COMMANDS else None
+    return None
+
+
+def build_parser(parser_class=argparse.ArgumentParser, command: str = None) -> argparse.ArgumentParser:
+    """Build the command line parser shared by the CLI, batch mode and the daemon
+
+    With ``command``, only that subcommand gets its arguments; the others are
+    registered by name alone, which still lets help and errors list them.
+    """
+    parser = parser_class(description="Fantasy Guild Manager CLI")
+    parser.add_argument("--data", default="guild_data.json", help="Guild data file")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="Storage backend (detected from existing files by default)")
+    parser.add_argument("--journal", action="store_true",
+                        help="Append changes to a journal instead of rewriting the data file")
+    parser.add_argument("--compact-after", type=int, default=1000,
+                        help="Fold the journal into the data file after this many records")
+    parser.add_argument("--format", choices=SNAPSHOT_FORMATS,
+                        help="Data file format for the json backend (keeps the current format by default)")
+    parser.add_argument("--compress", choices=COMPRESSIONS,
+                        help="Compress the data file (detected from the file or its .gz/.xz extension by default)")
+    parser.add_argument("--compress-level", type=int,
+                        help="Compression level: 1-9 for gzip, 0-9 for xz (default 6)")
+    parser.add_argument("--durability", choices=DURABILITY_LEVELS, default="safe",
+                        help="fast: atomic saves without fsync; safe: also fsync the file and its folder")
+    parser.add_argument("--as-of", metavar="TIME",
+                        help="Show the guild as it was at this date or time (member list, quest list, "
+                             "resource, resource balance/report, web and export only)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print how long each phase of the command took, as one JSON line on stderr")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="Append the timing line to FILE instead (implies --timings)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Write a cProfile dump of the command to FILE (view with python -m pstats FILE)")
+    
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+    for name, (help_text, add_arguments) in COMMANDS.items():
+        command_parser = subparsers.add_parser(name, help=help_text)
+        if command is None or command == name:
+            add_arguments(command_parser)
+    
+    return parser
+
+
+def parse_line(parser: argparse.ArgumentParser, argv: List[str], session: str) -> argparse.Namespace:
+    """Parse a batch line or daemon request, which runs against the guild the session opened
+
+    Global options (--data, --backend, ...) only apply when a guild is
+    opened, so a line giving any is refused rather than quietly run against
+    the session's guild. They can only come before the command. The
+    exception is --as-of, which run_line() honours.
+    """
+    args = parser.parse_args(argv)
+    if args.command is None or args.command in SESSION_COMMANDS:
+        raise CommandError("expected a command" if args.command is None
+                           else f"{args.command} can't run inside {session}")
+    given = [option for option in (arg.split("=", 1)[0] for arg in argv[:argv.index(args.command)]
+                                   if arg.startswith("-")) if option != "--as-of"]
+    if given:
+        raise CommandError(f"{', '.join(given)} can't be set per command; global options apply to {session} as a whole")
+    if args.as_of and not reads_only(args):
+        raise CommandError(AS_OF_COMMANDS)
+    return args
+
+
+def run_line(guild: GuildManager, args: argparse.Namespace):
+    """Run a command parsed by parse_line(), against the guild as it was then if it gives --as-of"""
+    run_command(guild.past(args.as_of) if args.as_of else guild, args)
+
+
+def run_command(guild: GuildManager, args: argparse.Namespace):
+    """Run one parsed command against the guild"""
+    if args.command == "member":
+        if args.member_action == "add":
+            guild.add_member(args.name, getattr(args, 'class'), args.level, args.description)
+        elif args.member_action == "remove":
+            guild.remove_member(args.name)
+        elif args.member_action == "list":
+            guild.list_members(args.character_class, args.status, args.min_level, args.max_level,
+                               args.sort, args.desc, args.limit)
+    
+    elif args.command == "quest":
+        if args.quest_action == "add":
+            guild.add_quest(args.title, args.description, args.reward, args.difficulty)
+        elif args.quest_action == "complete":
+            guild.complete_quest(args.title)
+        elif args.quest_action == "list":
+            if args.archived:
+                guild.list_archived_quests(args.since, args.until, args.difficulty, args.limit)
+            else:
+                guild.list_quests(args.status, args.difficulty, args.sort, args.desc, args.limit)
+        elif args.quest_action == "archive":
+            if guild.archive_quests(args.older_than):
+                guild.save_data()
+    
+    elif args.command == "resource":
+        if args.resource_action == "balance":
+            guild.resource_balance()
+        elif args.resource_action == "report":
+            guild.resource_report(args.period, args.since, args.until, args.limit)
+        elif args.resource_action == "ledger":
+            guild.resource_ledger(args.since, args.until, args.limit)
+        elif args.gold is None and args.item is None and args.quantity is None:
+            guild.show_resources()
+        else:
+            guild.update_resources(args.gold, args.item, args.quantity, args.reason, args.member, args.quest)
+    
+    elif args.command == "announce":
+        if args.message == "history":
+            guild.announcement_history(args.since, args.until, args.limit)
+        elif args.since or args.until or args.limit is not None:
+            print("[-] --since, --until and --limit only apply to 'announce history'")
+        else:
+            guild.add_announcement(args.message)
+    
+    elif args.command == "info":
+        guild.set_guild_info(args.name, args.description, args.archive_after,
+                             None if args.history is None else args.history == "on")
+    
+    elif args.command == "web":
+        guild.generate_webpage(args.output, args.archived)
+    
+    elif args.command == "search":
+        guild.search(" ".join(args.query), args.collections, args.limit, args.rebuild)
+    
+    elif args.command == "export":
+        match = {field: value for field, value in (("class", args.character_class), ("status", args.status),
+                                                   ("difficulty", args.difficulty)) if value}
+        guild.export(args.kind, args.output, args.output_format, args.fields, match, args.min_level,
+                     args.max_level, args.sort, args.desc, args.limit, not args.no_header)
     
+    elif args.command == "import":
+        guild.import_file(args.file, args.kind, args.input_format)
+    
+    elif args.command == "compact":
+        guild.compact()
+    
+    elif args.command == "convert":
+        guild.convert(args.output, args.output_backend, snapshot_format=args.output_format,
+                      compression=args.output_compress, compress_level=args.compress_level,
+                      durability=args.durability)
+
+
+def run_batch(guild: GuildManager, path: str, save_every: int = 0):
+    """Run commands from a file (or stdin for "-"), one per line, saving once at the end
+
+    Lines use the normal command syntax without the program name; blank lines
+    and lines starting with # are skipped. A line that fails is reported and
+    the batch carries on with the next one.
+    """
+    import shlex
+    parser = build_parser(CommandParser)
+    ran = failed = 0
+    f = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')
+    try:
+        with guild.batch():
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                ran += 1
+                try:
+                    run_line(guild, parse_line(parser, shlex.split(line), "a batch"))
+                except Exception as e:
+                    failed += 1
+                    print(f"[-] Line {line_number}: {e}")
+                except SystemExit:
+                    pass  # --help inside a batch line
+                if save_every and ran % save_every == 0:
+                    guild.flush()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    source = "stdin" if path == "-" else path
+    print(f"[+] Ran {ran} commands from {source} ({failed} failed)")
+
+
+def command_name(args: argparse.Namespace) -> str:
+    """The subcommand and its action, e.g. "member add", for reports"""
+    action = getattr(args, f"{args.command}_action", None)
+    return f"{args.command} {action}" if action else args.command
+
+
+def main():
+    started = time.perf_counter()
+    # Only the chosen subcommand's arguments are set up, to keep startup fast
+    parser = build_parser(command=find_command(sys.argv[1:]))
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return
     
-    guild = GuildManager(args.data)
+    if args.timings or args.metrics_file:
+        guild_timing.start(command_name(args), started).add("parse", time.perf_counter() - started)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     
     try:
-        if args.command == "member":
-            if args.member_action == "add":
-                guild.add_member(args.name, getattr(args, 'class'), args.level, args.description)
-            elif args.member_action == "remove":
-                guild.remove_member(args.name)
-            elif args.member_action == "list":
-                guild.list_members()
-        
-        elif args.command == "quest":
-            if args.quest_action == "add":
-                guild.add_quest(args.title, args.description, args.reward, args.difficulty)
-            elif args.quest_action == "complete":
-                guild.complete_quest(args.title)
-            elif args.quest_action == "list":
-                guild.list_quests()
-        
-        elif args.command == "resource":
-            guild.update_resources(args.gold, args.item, args.quantity)
-        
-        elif args.command == "announce":
-            guild.add_announcement(args.message)
-        
-        elif args.command == "info":
-            guild.set_guild_info(args.name, args.description)
-        
-        elif args.command == "web":
-            guild.generate_webpage(args.output)
+        run_main(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"[+] Profile written to {args.profile} (view with: python -m pstats {args.profile})")
+        timings = guild_timing.stop()
+        if timings:
+            guild_timing.emit(timings.record(data_file=args.data), args.metrics_file)
+
+
+def run_main(args: argparse.Namespace):
+    """Open the guild and run the parsed command line"""
+    if args.as_of and not reads_only(args):
+        print(f"[-] {AS_OF_COMMANDS}")
+        return
+    try:
+        guild = GuildManager(args.data, args.backend, args.as_of, journal=args.journal,
+                             compact_after=args.compact_after, snapshot_format=args.format,
+                             compression=args.compress, compress_level=args.compress_level,
+                             durability=args.durability)
+    except ValueError as e:
+        if args.as_of is None:
+            raise
+        print(f"[-] {e}")  # no history that far back, or not a date
+        return
+    
+    try:
+        if args.command == "batch":
+            run_batch(guild, args.file, args.save_every)
+        elif args.command == "serve-daemon":
+            from guild_daemon import default_socket, serve
+            serve(guild, args.socket or default_socket(args.data), args.commit_interval / 1000)
+        else:
+            run_command(guild, args)
     
     except KeyboardInterrupt:
         print("\nOperation cancelled.")
@@ -6,12 +6,32 @@ A simple, menu-driven interface for managing your guild
 
 import os
 import sys
+import argparse
+import itertools
+import guild_timing
+from guild_index import NAME_FIELDS
 from guild_manager import GuildManager
+from guild_storage import BACKENDS
+
+# Main menu choices, as named in timing records
+MENU_ACTIONS = {1: "members", 2: "quests", 3: "resources", 4: "announcements",
+                5: "settings", 6: "web", 7: "status"}
+
+# Entries shown at once when picking a member or quest by name
+PICK_LIMIT = 15
+# Announcements or archived quests shown by the history screens
+HISTORY_LIMIT = 50
+# Days and weeks shown by the resource report
+REPORT_DAYS = 14
+REPORT_WEEKS = 8
 
 class GuildMenuCLI:
-    def __init__(self):
-        self.guild = GuildManager()
+    def __init__(self, data_file="guild_data.json", backend=None, timings=False, metrics_file=None):
+        self.guild = GuildManager(data_file, backend)
         self.running = True
+        self.timings = timings or bool(metrics_file)
+        self.metrics_file = metrics_file
+        self.last_timings = None
     
     def clear_screen(self):
         """Clear the terminal screen"""
@@ -21,6 +41,38 @@ class GuildMenuCLI:
         """Wait for user to press Enter"""
         input("\nPress Enter to continue...")
     
+    def pick(self, collection: str, action: str, accept=None):
+        """Pick a member or quest by typing part of its name, then its number
+
+        Every line typed narrows the list to the names containing it, so the
+        list stays short however large the roster gets; a line that matches
+        nothing lists the closest spellings instead. Returns the chosen name,
+        or None if cancelled.
+        """
+        records = self.guild.data[collection]
+        field = NAME_FIELDS[collection]
+        index = self.guild.name_index(collection)
+        text = ""
+        while True:
+            keys = (key for key in index.matching(text) if accept is None or accept(records[key]))
+            shown = list(itertools.islice(keys, PICK_LIMIT + 1))
+            if not shown and text:
+                shown = [key for key in index.suggest(text, PICK_LIMIT) if accept is None or accept(records[key])]
+                print(f"\nNothing matches '{text}'." + (" Closest names:" if shown else ""))
+            elif text:
+                print(f"\nMatching '{text}':")
+            for i, key in enumerate(shown[:PICK_LIMIT], 1):
+                print(f"{i}. {records[key][field]}")
+            if len(shown) > PICK_LIMIT:
+                print("   ... and more; type part of a name to narrow the list")
+            
+            answer = input(f"\n{action} (number, or part of a name; Enter to cancel): ").strip()
+            if not answer:
+                return None
+            if answer.isdigit() and 1 <= int(answer) <= min(len(shown), PICK_LIMIT):
+                return records[shown[int(answer) - 1]][field]
+            text = answer
+    
     def show_main_menu(self):
         """Display the main menu"""
         self.clear_screen()
@@ -40,6 +92,11 @@ class GuildMenuCLI:
         print("7. View Guild Status")
         print("8. Exit")
         print()
+        if self.timings and self.last_timings:
+            phases = self.last_timings["phases"]
+            summary = ", ".join(f"{name} {ms:.1f} ms" for name, ms in phases.items()) or "nothing measured"
+            print(f"Last action ({self.last_timings['command']}): {summary}")
+            print()
     
     def get_choice(self, max_option):
         """Get user's menu choice"""
@@ -109,23 +166,15 @@ class GuildMenuCLI:
             return
         
         print("\nCurrent members:")
-        for i, member in enumerate(self.guild.data["members"].values(), 1):
-            print(f"{i}. {member['name']}")
-        
-        try:
-            choice = int(input("\nSelect member to remove (number): "))
-            members_list = list(self.guild.data["members"].values())
-            if 1 <= choice <= len(members_list):
-                member_name = members_list[choice - 1]['name']
-                confirm = input(f"Remove {member_name}? (y/N): ").lower()
-                if confirm == 'y':
-                    self.guild.remove_member(member_name)
-                else:
-                    print("Cancelled.")
+        member_name = self.pick("members", "Select member to remove")
+        if member_name is None:
+            print("Cancelled.")
+        else:
+            confirm = input(f"Remove {member_name}? (y/N): ").lower()
+            if confirm == 'y':
+                self.guild.remove_member(member_name)
             else:
-                print("Invalid selection!")
-        except ValueError:
-            print("Please enter a valid number!")
+                print("Cancelled.")
         
         self.pause()
     
@@ -145,10 +194,11 @@ class GuildMenuCLI:
             print("1. Add New Quest")
             print("2. Complete Quest")
             print("3. List All Quests")
-            print("4. Back to Main Menu")
+            print("4. List Archived Quests")
+            print("5. Back to Main Menu")
             print()
             
-            choice = self.get_choice(4)
+            choice = self.get_choice(5)
             
             if choice == 1:
                 self.add_quest()
@@ -157,6 +207,8 @@ class GuildMenuCLI:
             elif choice == 3:
                 self.list_quests()
             elif choice == 4:
+                self.list_archived_quests()
+            elif choice == 5:
                 break
     
     def add_quest(self):
@@ -190,26 +242,18 @@ class GuildMenuCLI:
     def complete_quest(self):
         """Mark a quest as completed"""
         print("\n--- Complete Quest ---")
-        available_quests = [q for q in self.guild.data["quests"].values() if q["status"] == "available"]
-        
-        if not available_quests:
+        if not self.guild.query("quests", {"status": "available"}, limit=1):
             print("No available quests to complete!")
             self.pause()
             return
         
         print("\nAvailable quests:")
-        for i, quest in enumerate(available_quests, 1):
-            print(f"{i}. {quest['title']}")
-        
-        try:
-            choice = int(input("\nSelect quest to complete (number): "))
-            if 1 <= choice <= len(available_quests):
-                quest_title = available_quests[choice - 1]['title']
-                self.guild.complete_quest(quest_title)
-            else:
-                print("Invalid selection!")
-        except ValueError:
-            print("Please enter a valid number!")
+        quest_title = self.pick("quests", "Select quest to complete",
+                                accept=lambda quest: quest["status"] == "available")
+        if quest_title is None:
+            print("Cancelled.")
+        else:
+            self.guild.complete_quest(quest_title)
         
         self.pause()
     
@@ -219,6 +263,12 @@ class GuildMenuCLI:
         self.guild.list_quests()
         self.pause()
     
+    def list_archived_quests(self):
+        """List the most recently completed quests from the archive"""
+        print("\n--- Archived Quests ---")
+        self.guild.list_archived_quests(limit=HISTORY_LIMIT)
+        self.pause()
+    
     def manage_resources_menu(self):
         """Resource management submenu"""
         while True:
@@ -226,15 +276,17 @@ class GuildMenuCLI:
             print("RESOURCE MANAGEMENT")
             print("=" * 22)
             print(f"Current Gold: {self.guild.data['resources']['gold']}")
+            self.show_rollups()
             print()
             print("1. Add/Remove Gold")
             print("2. Add Item to Inventory")
             print("3. Remove Item from Inventory")
             print("4. View All Resources")
-            print("5. Back to Main Menu")
+            print("5. View Daily and Weekly Report")
+            print("6. Back to Main Menu")
             print()
             
-            choice = self.get_choice(5)
+            choice = self.get_choice(6)
             
             if choice == 1:
                 self.manage_gold()
@@ -245,8 +297,25 @@ class GuildMenuCLI:
             elif choice == 4:
                 self.view_resources()
             elif choice == 5:
+                self.view_resource_report()
+            elif choice == 6:
                 break
     
+    def show_rollups(self):
+        """Today's and this week's gold movements, from the ledger rollups"""
+        from datetime import datetime
+        from guild_ledger import totals_for
+        now = datetime.now().isoformat()
+        for label, period in (("Today", "day"), ("This week", "week")):
+            totals = totals_for(self.guild.data, period, now)
+            print(f"{label}: +{totals.get('gold_in', 0)} / -{totals.get('gold_out', 0)} gold")
+    
+    def view_resource_report(self):
+        """Gold and item totals for the last days and weeks"""
+        self.guild.resource_report("day", limit=REPORT_DAYS)
+        self.guild.resource_report("week", limit=REPORT_WEEKS)
+        self.pause()
+    
     def manage_gold(self):
         """Add or remove gold"""
         print("\n--- Manage Gold ---")
@@ -254,7 +323,8 @@ class GuildMenuCLI:
         
         try:
             amount = int(input("Enter amount (positive to add, negative to remove): "))
-            self.guild.update_resources(gold=amount)
+            reason = input("Reason (optional): ").strip()
+            self.guild.update_resources(gold=amount, reason=reason or None)
         except ValueError:
             print("Please enter a valid number!")
         
@@ -331,17 +401,20 @@ class GuildMenuCLI:
             print("=" * 23)
             print()
             print("1. Add New Announcement")
-            print("2. View All Announcements")
-            print("3. Back to Main Menu")
+            print("2. View Recent Announcements")
+            print("3. View Announcement History")
+            print("4. Back to Main Menu")
             print()
             
-            choice = self.get_choice(3)
+            choice = self.get_choice(4)
             
             if choice == 1:
                 self.add_announcement()
             elif choice == 2:
                 self.view_announcements()
             elif choice == 3:
+                self.view_announcement_history()
+            elif choice == 4:
                 break
     
     def add_announcement(self):
@@ -356,8 +429,15 @@ class GuildMenuCLI:
         self.guild.add_announcement(message)
         self.pause()
     
+    def view_announcement_history(self):
+        """View archived announcements, optionally from a date on"""
+        print("\n--- Announcement History ---")
+        since = input("From date (e.g. 2026-10-01, optional): ").strip()
+        self.guild.announcement_history(since or None, limit=HISTORY_LIMIT)
+        self.pause()
+    
     def view_announcements(self):
-        """View all announcements"""
+        """View the most recent announcements"""
         print("\n--- Guild Announcements ---")
         announcements = self.guild.data.get('announcements', [])
         
@@ -380,16 +460,20 @@ class GuildMenuCLI:
             print()
             print("1. Change Guild Name")
             print("2. Change Guild Description")
-            print("3. Back to Main Menu")
+            print(f"3. Timing Report ({'on' if self.timings else 'off'})")
+            print("4. Back to Main Menu")
             print()
             
-            choice = self.get_choice(3)
+            choice = self.get_choice(4)
             
             if choice == 1:
                 self.change_guild_name()
             elif choice == 2:
                 self.change_guild_description()
             elif choice == 3:
+                self.timings = not self.timings
+                self.last_timings = None
+            elif choice == 4:
                 break
     
     def change_guild_name(self):
@@ -478,6 +562,8 @@ class GuildMenuCLI:
         while self.running:
             self.show_main_menu()
             choice = self.get_choice(8)
+            if self.timings and choice in MENU_ACTIONS:
+                guild_timing.start(f"menu {MENU_ACTIONS[choice]}")
             
             if choice == 1:
                 self.manage_members_menu()
@@ -496,15 +582,47 @@ class GuildMenuCLI:
             elif choice == 8:
                 print("\nThanks for using Fantasy Guild Manager!")
                 self.running = False
+            self.record_timings()
+    
+    def record_timings(self):
+        """Keep the timings of the last menu action and log them to the metrics file"""
+        timings = guild_timing.stop()
+        if timings is None or not self.timings:
+            return
+        # Menu actions wait for input, so only the measured phases mean anything
+        self.last_timings = timings.record(total=False, data_file=self.guild.data_file)
+        if self.metrics_file:
+            guild_timing.emit(self.last_timings, self.metrics_file)
 
 def main():
+    parser = argparse.ArgumentParser(description="Fantasy Guild Manager - Interactive Menu")
+    parser.add_argument("--data", default="guild_data.json", help="Guild data file")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="Storage backend (detected from existing files by default)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Show how long the phases of each menu action took")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="Also append a JSON timing line per menu action to FILE (implies --timings)")
+    parser.add_argument("--profile", metavar="FILE", help="Write a cProfile dump of the session to FILE")
+    args = parser.parse_args()
+    
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     try:
-        cli = GuildMenuCLI()
+        cli = GuildMenuCLI(args.data, args.backend, args.timings, args.metrics_file)
         cli.run()
     except KeyboardInterrupt:
         print("\n\nGoodbye!")
     except Exception as e:
         print(f"\nError: {e}")
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile} (view with: python -m pstats {args.profile})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,184 @@
+"""
+Compact in-memory records for the Fantasy Guild Manager
+Members and quests are held as read-only __slots__ records instead of dicts
+"""
+
+import sys
+from collections.abc import Mapping
+from operator import attrgetter
+
+_MISSING = object()
+
+
+class Record(Mapping):
+    """A read-only, dict-like record with one slot per known field
+
+    A dict pays for a hash table and a pointer per key in every record;
+    here the field names live once on the class. Fields a record doesn't
+    have are skipped when iterating, and unknown keys are kept in ``_extra``,
+    so converting to a dict (``dict(record)``) gives back exactly what was
+    loaded. Values repeated across records (class, status, difficulty) are
+    interned so the guild holds a single copy of each.
+
+    Records are immutable: to change one, copy it with dict(), edit the copy
+    and store that, the way GuildManager already does.
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS = ()
+    INTERNED = ()
+    _SLOTS = {}
+
+    def __init__(self, values: Mapping):
+        extra = None
+        for field in self.FIELDS:
+            object.__setattr__(self, self._SLOTS[field], _MISSING)
+        for key, value in values.items():
+            slot = self._SLOTS.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if key in self.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, slot, value)
+        object.__setattr__(self, "_extra", extra)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def __getitem__(self, key):
+        slot = self._SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        # Mapping.get goes through __getitem__ and KeyError; this is the hot path for indexing
+        slot = self._SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, self._SLOTS[field]) is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self, convert=None) -> dict:
+        """The record as a plain dict, much faster than dict(record)
+
+        ``convert``, if given, is applied to the values of unknown keys,
+        which (unlike the known fields) may hold nested containers.
+        """
+        values = {field: value for field, value in zip(self.FIELDS, self._VALUES(self)) if value is not _MISSING}
+        if self._extra is not None:
+            values.update(self._extra if convert is None else
+                          ((key, convert(value)) for key, value in self._extra.items()))
+        return values
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def __reduce__(self):
+        return (type(self), (self.to_dict(),))
+
+
+def _slot_names(fields):
+    # "class" can't be an attribute name, so every slot gets a trailing underscore
+    return {field: field + "_" for field in fields}
+
+
+class Member(Record):
+    """A guild member"""
+
+    FIELDS = ("name", "class", "level", "description", "status", "joined_date")
+    INTERNED = ("class", "status")
+    _SLOTS = _slot_names(FIELDS)
+    _VALUES = attrgetter(*_SLOTS.values())
+    __slots__ = tuple(_SLOTS.values())
+
+
+class Quest(Record):
+    """A quest on the guild board"""
+
+    FIELDS = ("title", "description", "reward", "difficulty", "status", "created_date", "completed_date")
+    INTERNED = ("difficulty", "status")
+    _SLOTS = _slot_names(FIELDS)
+    _VALUES = attrgetter(*_SLOTS.values())
+    __slots__ = tuple(_SLOTS.values())
+
+
+# Collections whose values are held as records
+RECORD_TYPES = {"members": Member, "quests": Quest}
+
+
+def to_record(collection: str, value):
+    """Return value as a record if the collection holds records, else unchanged"""
+    record_type = RECORD_TYPES.get(collection)
+    if record_type is None or not isinstance(value, Mapping) or isinstance(value, record_type):
+        return value
+    return record_type(value)
+
+
+def compact_collection(collection: str, records: dict) -> dict:
+    """Turn every value of a loaded collection into a record, in place"""
+    if collection in RECORD_TYPES and isinstance(records, dict):
+        for key, value in records.items():
+            records[key] = to_record(collection, value)
+    return records
+
+
+def compact_guild(data) -> dict:
+    """Turn the members and quests of freshly loaded guild data into records"""
+    for collection in RECORD_TYPES:
+        if isinstance(data.get(collection), dict):
+            compact_collection(collection, data[collection])
+    return data
+
+
+def field_reader(collection: str, fields):
+    """Return a function giving a record's values for fields as a tuple (None where missing)
+
+    Records of the collection's type are read straight from their slots in
+    one go, far faster than a lookup per field; anything else (plain dicts
+    from SQLite, say) goes through get().
+    """
+    fields = tuple(fields)
+    record_type = RECORD_TYPES.get(collection)
+    if record_type is None or not fields or any(field not in record_type._SLOTS for field in fields):
+        return lambda record: tuple(record.get(field) for field in fields)
+    getter = attrgetter(*(record_type._SLOTS[field] for field in fields))
+    single = len(fields) == 1
+
+    def read(record):
+        if type(record) is not record_type:
+            return tuple(record.get(field) for field in fields)
+        values = (getter(record),) if single else getter(record)
+        if _MISSING in values:
+            return tuple(None if value is _MISSING else value for value in values)
+        return values
+
+    return read
+
+
+def json_default(value):
+    """``default`` for json.dump: write records as the plain objects they came from"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
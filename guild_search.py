@@ -0,0 +1,327 @@
+"""
+Full-text search for the Fantasy Guild Manager
+An inverted index over member descriptions, quest text and announcements,
+kept next to the data file and brought up to date from a change log
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+from bisect import bisect_left, insort
+
+from guild_storage import atomic_write, dump_binary, load_snapshot
+
+# collection: fields whose text is searchable
+SEARCH_FIELDS = {
+    "members": ("description",),
+    "quests": ("title", "description", "reward"),
+    "announcements": ("message",),
+}
+
+INDEX_FORMAT = 1
+# Log entries replayed on load before the index file is rewritten
+REWRITE_AFTER = 100
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+_WORD = re.compile(r"\w+")
+_QUERY_TERM = re.compile(r"\w+\*?")
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased words of a text"""
+    return _WORD.findall(text.lower())
+
+
+def document_id(collection: str, key) -> str:
+    return f"{collection}/{key}"
+
+
+def split_document_id(doc: str):
+    """The collection and key a document id stands for"""
+    collection, key = doc.split("/", 1)
+    return collection, key
+
+
+def touched_documents(change) -> list:
+    """The (collection, key) pairs whose text a change may alter; key None means the whole collection"""
+    path = change["path"]
+    collection = path[0]
+    if collection not in SEARCH_FIELDS:
+        return []
+    # Announcements are few and shift position on every push; they are reindexed together
+    if collection == "announcements":
+        return [(collection, None)]
+    if len(path) >= 2:
+        return [(collection, path[1])]
+    if change["op"] == "merge":
+        return [(collection, key) for key in change["value"]]
+    return [(collection, None)]
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking and prefix queries
+
+    ``postings`` maps each term to {document id: term count}; ``terms`` is
+    the sorted vocabulary used to expand prefix queries ("heal*"). Each
+    document remembers its terms, so it can be taken out again when its
+    record changes or goes away.
+
+    Queries walk per-term lists of documents ordered by their score for
+    that term, and stop once no unseen document could make the top results
+    (Fagin's threshold algorithm). Those lists are built when a term is
+    first queried and kept until a document with the term changes, so
+    repeated queries in a long-running session touch only a few entries.
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.postings = {}
+        self.terms = []
+        self.doc_terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.announcements = 0
+        self._ranked = {}
+        self._ranked_prefixes = {}
+
+    @classmethod
+    def build(cls, data, version: int = 0) -> "SearchIndex":
+        """Index every searchable record of the guild"""
+        index = cls(version)
+        index.terms = None  # sorted once at the end rather than kept sorted term by term
+        for collection in SEARCH_FIELDS:
+            index.update(data, [(collection, None)])
+        index.terms = sorted(index.postings)
+        return index
+
+    def add(self, doc: str, text: str):
+        counts = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return
+        for term, count in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                if self.terms is not None:
+                    insort(self.terms, term)
+            postings[doc] = count
+            self._forget(term)
+        self.doc_terms[doc] = tuple(counts)
+        length = sum(counts.values())
+        self.lengths[doc] = length
+        self.total_length += length
+
+    def remove(self, doc: str):
+        terms = self.doc_terms.pop(doc, None)
+        if terms is None:
+            return
+        for term in terms:
+            self._forget(term)
+            postings = self.postings[term]
+            del postings[doc]
+            if not postings:
+                del self.postings[term]
+                if self.terms is not None:
+                    del self.terms[bisect_left(self.terms, term)]
+        self.total_length -= self.lengths.pop(doc)
+
+    def update(self, data, targets):
+        """Reindex the given (collection, key) pairs from the current guild data"""
+        for collection, key in targets:
+            fields = SEARCH_FIELDS[collection]
+            if collection == "announcements":
+                for position in range(self.announcements):
+                    self.remove(document_id(collection, position))
+                announcements = data.get("announcements", [])
+                for position, announcement in enumerate(announcements):
+                    self.add(document_id(collection, position), _text(announcement, fields))
+                self.announcements = len(announcements)
+            elif key is None:
+                prefix = collection + "/"
+                for doc in [doc for doc in self.lengths if doc.startswith(prefix)]:
+                    self.remove(doc)
+                for record_key, record in data[collection].items():
+                    self.add(document_id(collection, record_key), _text(record, fields))
+            else:
+                doc = document_id(collection, key)
+                self.remove(doc)
+                record = data[collection].get(key)
+                if record is not None:
+                    self.add(doc, _text(record, fields))
+
+    def _matches(self, term: str) -> dict:
+        """{document id: count} for a query term, merged over the terms a prefix stands for"""
+        if not term.endswith("*"):
+            return self.postings.get(term, {})
+        prefix = term[:-1]
+        merged = {}
+        for position in range(bisect_left(self.terms, prefix), len(self.terms)):
+            candidate = self.terms[position]
+            if not candidate.startswith(prefix):
+                break
+            for doc, count in self.postings[candidate].items():
+                merged[doc] = merged.get(doc, 0) + count
+        return merged
+
+    def _forget(self, term: str):
+        """Drop the ranked lists a change to term's documents makes stale"""
+        self._ranked.pop(term, None)
+        if self._ranked_prefixes:
+            for prefix in [prefix for prefix in self._ranked_prefixes if term.startswith(prefix[:-1])]:
+                del self._ranked_prefixes[prefix]
+
+    def _ranked_list(self, term: str):
+        """Documents matching a query term scored for it (BM25), best first, and the scores by document"""
+        cache = self._ranked_prefixes if term.endswith("*") else self._ranked
+        ranked = cache.get(term)
+        if ranked is None:
+            matches = self._matches(term)
+            documents = len(self.lengths)
+            average = self.total_length / documents if documents else 1
+            weight = math.log(1 + (documents - len(matches) + 0.5) / (len(matches) + 0.5))
+            scores = {doc: weight * count * (K1 + 1) / (count + K1 * (1 - B + B * self.lengths[doc] / average))
+                      for doc, count in matches.items()}
+            order = sorted(scores, key=lambda doc: (-scores[doc], doc))
+            ranked = cache[term] = ([(scores[doc], doc) for doc in order], scores)
+        return ranked
+
+    def search(self, query: str, collections=None, limit: int = 20) -> list:
+        """Return (score, document id) pairs for documents containing every query term, best first"""
+        lists = [self._ranked_list(term) for term in dict.fromkeys(_QUERY_TERM.findall(query.lower()))]
+        if not lists or not all(ranked for ranked, _ in lists) or limit <= 0:
+            return []
+        prefixes = tuple(collection + "/" for collection in collections) if collections else None
+        found = []
+        best = []  # min-heap of the top `limit` scores so far
+        seen = set()
+        for depth in range(min(len(ranked) for ranked, _ in lists)):
+            # No document below this depth in every list can score more than this
+            threshold = 0.0
+            for ranked, _ in lists:
+                score, doc = ranked[depth]
+                threshold += score
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                if prefixes and not doc.startswith(prefixes):
+                    continue
+                total = 0.0
+                for _, scores in lists:
+                    term_score = scores.get(doc)
+                    if term_score is None:
+                        break
+                    total += term_score
+                else:
+                    found.append((total, doc))
+                    heapq.heappush(best, total)
+                    if len(best) > limit:
+                        heapq.heappop(best)
+            if len(best) == limit and best[0] > threshold:
+                break
+        return heapq.nsmallest(limit, found, key=lambda item: (-item[0], item[1]))
+
+    def payload(self) -> dict:
+        return {"format": INDEX_FORMAT, "version": self.version, "postings": self.postings,
+                "doc_terms": self.doc_terms, "lengths": self.lengths, "announcements": self.announcements}
+
+    @classmethod
+    def from_payload(cls, payload) -> "SearchIndex":
+        if payload.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported search index format: {payload.get('format')}")
+        index = cls(payload["version"])
+        index.postings = payload["postings"]
+        index.terms = sorted(index.postings)
+        index.doc_terms = payload["doc_terms"]
+        index.lengths = payload["lengths"]
+        index.total_length = sum(index.lengths.values())
+        index.announcements = payload["announcements"]
+        return index
+
+
+def _text(record, fields) -> str:
+    return " ".join(str(record.get(field) or "") for field in fields)
+
+
+def log_changes(index_file: str, version: int, changes):
+    """Note which documents a save at version touched, for an index file to catch up on later
+
+    Called with the guild's lock held, and only while an index file exists.
+    """
+    targets = sorted({target for change in changes for target in touched_documents(change)},
+                     key=lambda target: (target[0], target[1] or ""))
+    line = json.dumps({"version": version, "docs": targets}, ensure_ascii=False, separators=(',', ':'))
+    with open(index_file + ".log", 'a', encoding='utf-8') as f:
+        f.write(line + "\n")
+
+
+def _read_log(log_file: str) -> list:
+    entries = []
+    if not os.path.exists(log_file):
+        return entries
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # torn final line of an interrupted append
+    return entries
+
+
+def load_index(index_file: str, data, version: int, lock, persist: bool = True) -> SearchIndex:
+    """Return the search index for the guild data at version
+
+    The index file is read and the documents logged by later saves are
+    reindexed. If that can't account for every save since the file was
+    written (no file, a gap in the log, a restored data file), the index is
+    rebuilt from the guild. The file is rewritten after a rebuild or once
+    the log gets long, unless ``persist`` is False (the data has unsaved
+    changes the file must not claim to cover).
+    """
+    index = None
+    replayed = 0
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'rb') as f:
+                index = SearchIndex.from_payload(load_snapshot(f)[0])
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            print(f"Warning: Rebuilding search index {index_file}: {e}")
+    if index is not None and index.version != version:
+        entries = [entry for entry in _read_log(index_file + ".log")
+                   if index.version < entry["version"] <= version]
+        if index.version > version or {entry["version"] for entry in entries} != set(
+                range(index.version + 1, version + 1)):
+            index = None
+        else:
+            targets = {tuple(target) for entry in entries for target in entry["docs"]}
+            index.update(data, targets)
+            index.version = version
+            replayed = len(entries)
+    if index is None:
+        index = SearchIndex.build(data, version)
+        replayed = REWRITE_AFTER
+    if persist and replayed >= REWRITE_AFTER:
+        save_index(index_file, index, lock)
+    return index
+
+
+def save_index(index_file: str, index: SearchIndex, lock):
+    """Write the index file and drop the log entries it now covers
+
+    Skipped if a save newer than the index was logged meanwhile; the next
+    search catches up instead.
+    """
+    with lock:
+        if any(entry["version"] > index.version for entry in _read_log(index_file + ".log")):
+            return
+        # Derived data that can always be rebuilt, so no fsync
+        with atomic_write(index_file, "fast") as temp_file:
+            with open(temp_file, 'wb') as f:
+                dump_binary(index.payload(), f)
+        if os.path.exists(index_file + ".log"):
+            os.remove(index_file + ".log")
@@ -0,0 +1,388 @@
+"""
+SQLite storage backend for the Fantasy Guild Manager
+Keeps members, quests, items, announcements and ledger totals in indexed tables
+"""
+
+import json
+import sqlite3
+from collections.abc import MutableMapping
+from typing import Dict, List, Any
+
+from guild_index import INDEXED_FIELDS, match_key
+from guild_model import json_default
+from guild_storage import Storage, apply_change, collection_of, default_guild_data, meta_of
+from guild_timing import phase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS members (
+    key TEXT PRIMARY KEY, value TEXT NOT NULL,
+    name TEXT, "class" TEXT, level INTEGER, status TEXT
+);
+CREATE TABLE IF NOT EXISTS quests (
+    key TEXT PRIMARY KEY, value TEXT NOT NULL,
+    title TEXT, difficulty TEXT, status TEXT
+);
+CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS announcements (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ledger (
+    period TEXT NOT NULL, start TEXT NOT NULL, field TEXT NOT NULL, item TEXT NOT NULL DEFAULT '',
+    value INTEGER NOT NULL, PRIMARY KEY (period, start, field, item)
+);
+CREATE INDEX IF NOT EXISTS members_class ON members ("class");
+CREATE INDEX IF NOT EXISTS members_level ON members (level);
+CREATE INDEX IF NOT EXISTS members_status ON members (status);
+CREATE INDEX IF NOT EXISTS quests_status ON quests (status);
+CREATE INDEX IF NOT EXISTS quests_difficulty ON quests (difficulty);
+CREATE INDEX IF NOT EXISTS members_class_lower ON members (lower("class"));
+CREATE INDEX IF NOT EXISTS members_status_lower ON members (lower(status));
+CREATE INDEX IF NOT EXISTS quests_status_lower ON quests (lower(status));
+CREATE INDEX IF NOT EXISTS quests_difficulty_lower ON quests (lower(difficulty));
+"""
+
+# Pages copied per step of a history backup; other connections may write between steps
+BACKUP_PAGES = 1024
+
+# Adds to one ledger total in place, so a save touches only the totals it moves
+LEDGER_ADD = ("INSERT INTO ledger (period, start, field, item, value) VALUES (?, ?, ?, ?, ?) "
+              "ON CONFLICT (period, start, field, item) DO UPDATE SET value = value + excluded.value")
+
+# Record fields copied into their own (indexed) columns, per table
+MEMBER_COLUMNS = ["name", "class", "level", "status"]
+QUEST_COLUMNS = ["title", "difficulty", "status"]
+
+
+def _identity(value):
+    return value
+
+
+def _encode_record(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+
+def _ledger_key(path: List[str]) -> tuple:
+    """The ledger row of a rollup path: ["ledger", period, start, field] or [..., "items", item]"""
+    period, start, field, *item = path[1:]
+    return period, start, field, item[0] if item else ""
+
+
+def _ledger_rows(ledger: Dict[str, Any]):
+    """Yield the (period, start, field, item, value) rows of the guild's ledger totals"""
+    for period, rollups in ledger.items():
+        for start, totals in rollups.items():
+            for field, value in totals.items():
+                if isinstance(value, dict):
+                    for item, quantity in value.items():
+                        yield period, start, field, item, quantity
+                else:
+                    yield period, start, field, "", value
+
+
+class SqliteTable(MutableMapping):
+    """A dict-like view of a key/value table
+
+    Reads and writes go straight to the database, so the guild never has to
+    be loaded into memory as a whole. Writes join the connection's open
+    transaction and become durable when the storage commits on save.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table: str, columns: List[str] = (),
+                 encode=_encode_record, decode=json.loads):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.encode = encode
+        self.decode = decode
+
+        names = ", ".join(f'"{column}"' for column in ["key", "value"] + self.columns)
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 2))
+        updates = ", ".join(f'"{column}" = excluded."{column}"' for column in ["value"] + self.columns)
+        # An upsert keeps the row (and so the listing order) of existing keys
+        self._upsert_sql = (f"INSERT INTO {table} ({names}) VALUES ({placeholders}) "
+                            f"ON CONFLICT(key) DO UPDATE SET {updates}")
+
+    def __getitem__(self, key):
+        row = self.conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self.decode(row[0])
+
+    def __setitem__(self, key, value):
+        self.conn.execute(self._upsert_sql, self._row(key, value))
+
+    def __delitem__(self, key):
+        cursor = self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self):
+        for (key,) in self.conn.execute(f"SELECT key FROM {self.table} ORDER BY rowid"):
+            yield key
+
+    def __len__(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def __bool__(self):
+        return self.conn.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is not None
+
+    def items(self):
+        """Stream (key, value) pairs in insertion order"""
+        for key, value in self.conn.execute(f"SELECT key, value FROM {self.table} ORDER BY rowid"):
+            yield key, self.decode(value)
+
+    def values(self):
+        """Stream values in insertion order"""
+        for (value,) in self.conn.execute(f"SELECT value FROM {self.table} ORDER BY rowid"):
+            yield self.decode(value)
+
+    def query(self, match=None, low=None, high=None, sort: str = None, descending: bool = False,
+              limit: int = None):
+        """Return matching (key, value) pairs, like CollectionIndex.query but answered in SQL"""
+        return list(self.iter_query(match, low, high, sort, descending, limit))
+
+    def iter_query(self, match=None, low=None, high=None, sort: str = None, descending: bool = False,
+                   limit: int = None):
+        """Stream the (key, value) pairs query() would return
+
+        Exact matches use the lower() indexes, and the sorted field of
+        INDEXED_FIELDS (level) is bounded and ordered with its own index.
+        """
+        ranged = INDEXED_FIELDS[self.table][1]
+        where, params = [], []
+        for field, value in (match or {}).items():
+            where.append(f'lower("{field}") = ?')
+            params.append(match_key(value))
+        if low is not None:
+            where.append(f'"{ranged}" >= ?')
+            params.append(low)
+        if high is not None:
+            where.append(f'"{ranged}" <= ?')
+            params.append(high)
+
+        direction = " DESC" if descending else ""
+        if sort is None:
+            order = f"rowid{direction}"
+        else:
+            column = f'"{sort}"' if sort in self.columns else f"json_extract(value, '$.{sort}')"
+            collate = "" if sort == ranged else " COLLATE NOCASE"
+            order = f"{column}{collate}{direction}, rowid{direction}"
+        sql = f"SELECT key, value FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        for key, value in self.conn.execute(sql, params):
+            yield key, self.decode(value)
+
+    def replace_all(self, mapping: Dict[str, Any]):
+        """Replace the whole table with the contents of mapping"""
+        self.conn.execute(f"DELETE FROM {self.table}")
+        self.conn.executemany(self._upsert_sql, (self._row(key, value) for key, value in mapping.items()))
+
+    def _row(self, key, value):
+        return [key, self.encode(value)] + [value.get(column) for column in self.columns]
+
+
+class SqliteResources(MutableMapping):
+    """The guild's resources: gold lives in the meta table, items in their own"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.items_table = SqliteTable(conn, "items", encode=_identity, decode=_identity)
+
+    def __getitem__(self, key):
+        if key == "items":
+            return self.items_table
+        if key == "gold":
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'gold'").fetchone()
+            return json.loads(row[0]) if row else 0
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != "gold":
+            raise KeyError(key)
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('gold', ?)", (json.dumps(value),))
+
+    def __delitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(["gold", "items"])
+
+    def __len__(self):
+        return 2
+
+
+class SqliteStorage(Storage):
+    """Stores the guild in an SQLite database
+
+    Members, quests, items and gold are exposed as dict-like views on the
+    tables, so GuildManager, the menu and the web generator work unchanged
+    while member and quest lookups use the primary key and
+    class/level/status/difficulty indexes instead of loading everything.
+
+    Changes are written as they are made, inside a transaction that begin()
+    opens with a write lock and save() commits. SQLite thereby serialises
+    concurrent writers itself, and increments such as gold always apply to
+    the latest value. ``durability`` picks how hard commits sync ("fast"
+    leaves flushing to the OS, "safe" syncs on every commit).
+    """
+
+    backend = "sqlite"
+    transactional = True
+
+    def __init__(self, data_file: str, durability: str = "safe"):
+        self.data_file = data_file
+        self.durability = durability
+        self.conn = None
+
+    def load(self) -> Dict[str, Any]:
+        """Open the database and return table-backed guild data"""
+        if self.conn is not None:
+            # Reloading discards uncommitted writes, like re-reading a file would
+            self.conn.rollback()
+            self.conn.close()
+        # Transactions are opened explicitly by begin(); wait for other writers.
+        # Callers that share the storage between threads (the daemon) serialise access themselves.
+        self.conn = sqlite3.connect(self.data_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous = " + ("FULL" if self.durability == "safe" else "OFF"))
+        self.conn.executescript(SCHEMA)
+
+        data = default_guild_data()
+        for key, value in self.conn.execute("SELECT key, value FROM meta WHERE key != 'gold'"):
+            data[key] = json.loads(value)
+        if "ledger" in data:
+            # Databases written before the ledger table kept the totals in meta
+            self._migrate_ledger()
+        data["ledger"] = self._load_ledger()
+
+        data["members"] = SqliteTable(self.conn, "members", MEMBER_COLUMNS)
+        data["quests"] = SqliteTable(self.conn, "quests", QUEST_COLUMNS)
+        data["resources"] = SqliteResources(self.conn)
+        data["announcements"] = [
+            json.loads(value) for (value,) in
+            self.conn.execute("SELECT value FROM announcements ORDER BY id DESC")
+        ]
+        return data
+
+    def begin(self):
+        """Take the database write lock for the changes that follow"""
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+
+    def save(self, data: Dict[str, Any], changes: List[Dict[str, Any]]):
+        """Commit table changes made since the last save"""
+        self.begin()
+        for change in changes:
+            collection = collection_of(change["path"])
+            if collection == "announcements" and change["op"] == "push":
+                self._insert_announcement(change["value"], change.get("keep"))
+            elif collection == "meta" and change["path"][0] == "ledger":
+                if change["op"] == "incr":
+                    self._add_to_ledger(data, change)
+                else:
+                    self._replace_ledger(data.get("ledger", {}))
+            elif collection == "meta":
+                key = change["path"][0]
+                if change["op"] == "incr":
+                    # Add to the stored counters, which another process may have moved on since we loaded
+                    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                    current = {key: json.loads(row[0])} if row else {}
+                    apply_change(current, change)
+                    data[key] = current[key]
+                self._write_meta({key: data[key]})
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        data["version"] = (json.loads(version[0]) if version else 0) + 1
+        self._write_meta({"version": data["version"]})
+        with phase("commit"):
+            self.conn.commit()
+
+    def compact(self, data: Dict[str, Any]):
+        """Commit pending changes and reclaim unused space"""
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute("VACUUM")
+
+    def replace(self, data: Dict[str, Any]):
+        """Overwrite the database with the given guild data"""
+        if self.conn is None:
+            self.load()
+        self.begin()
+        SqliteTable(self.conn, "members", MEMBER_COLUMNS).replace_all(data["members"])
+        SqliteTable(self.conn, "quests", QUEST_COLUMNS).replace_all(data["quests"])
+        SqliteTable(self.conn, "items", encode=_identity, decode=_identity).replace_all(
+            data["resources"]["items"])
+        self.conn.execute("DELETE FROM announcements")
+        for announcement in reversed(data["announcements"]):
+            self._insert_announcement(announcement)
+        self._replace_ledger(data.get("ledger", {}))
+        self.conn.execute("DELETE FROM meta")
+        meta = meta_of(data)
+        meta.pop("ledger", None)
+        meta["gold"] = data["resources"]["gold"]
+        self._write_meta(meta)
+        self.conn.commit()
+
+    def backup(self, path: str) -> Dict[str, Any]:
+        """Copy the committed database to path with SQLite's online backup; returns the copy's version and last_updated
+
+        The copy goes a few pages at a time and starts over if another
+        connection writes meanwhile, so writers are never held up by it.
+        """
+        target = sqlite3.connect(path)
+        try:
+            with phase("backup"):
+                self.conn.backup(target, pages=BACKUP_PAGES)
+            meta = {key: json.loads(value) for key, value in
+                    target.execute("SELECT key, value FROM meta WHERE key IN ('version', 'last_updated')")}
+        finally:
+            target.close()
+        return {"version": meta.get("version", 0), "last_updated": meta.get("last_updated")}
+
+    def _insert_announcement(self, announcement: Dict[str, Any], keep: int = None):
+        self.conn.execute("INSERT INTO announcements (value) VALUES (?)", (_encode_record(announcement),))
+        if keep is not None:
+            self.conn.execute("DELETE FROM announcements WHERE id NOT IN "
+                              "(SELECT id FROM announcements ORDER BY id DESC LIMIT ?)", (keep,))
+
+    def _add_to_ledger(self, data: Dict[str, Any], change: Dict[str, Any]):
+        """Add a rollup increment to its row and refresh the loaded total, which another process may have moved on"""
+        key = _ledger_key(change["path"])
+        self.conn.execute(LEDGER_ADD, key + (change["delta"],))
+        (value,) = self.conn.execute("SELECT value FROM ledger WHERE period = ? AND start = ? AND field = ? "
+                                     "AND item = ?", key).fetchone()
+        apply_change(data, {"op": "set", "path": change["path"], "value": value})
+
+    def _replace_ledger(self, ledger: Dict[str, Any]):
+        self.conn.execute("DELETE FROM ledger")
+        self.conn.executemany("INSERT INTO ledger (period, start, field, item, value) VALUES (?, ?, ?, ?, ?)",
+                              _ledger_rows(ledger))
+
+    def _load_ledger(self) -> Dict[str, Any]:
+        """The ledger totals as nested dicts: {period: {start: {field: value, "items": {item: quantity}}}}"""
+        ledger = {}
+        for period, start, field, item, value in self.conn.execute(
+                "SELECT period, start, field, item, value FROM ledger ORDER BY rowid"):
+            totals = ledger.setdefault(period, {}).setdefault(start, {})
+            if item:
+                totals.setdefault(field, {})[item] = value
+            else:
+                totals[field] = value
+        return ledger
+
+    def _migrate_ledger(self):
+        """Move ledger totals kept in the meta table into the ledger table"""
+        self.begin()
+        # Another process may have moved them while we waited for the lock
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'ledger'").fetchone()
+        if row is not None:
+            self.conn.executemany(LEDGER_ADD, _ledger_rows(json.loads(row[0])))
+            self.conn.execute("DELETE FROM meta WHERE key = 'ledger'")
+        self.conn.commit()
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              ((key, json.dumps(value, ensure_ascii=False)) for key, value in meta.items()))
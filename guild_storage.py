@@ -0,0 +1,876 @@
+"""
+Storage backends for the Fantasy Guild Manager
+Handles reading and writing guild data to disk
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import io
+import json
+import os
+import stat
+import struct
+import zlib
+from collections.abc import Mapping, MutableMapping
+
+from guild_model import Record, compact_collection, compact_guild, json_default, to_record
+from guild_timing import phase
+
+# Startup time matters for a CLI: pickle, tempfile, shutil and datetime are
+# imported where they are used, and typing only by type checkers (annotations
+# are never evaluated, thanks to the __future__ import).
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Any
+
+
+def default_guild_data() -> Dict[str, Any]:
+    """Return the structure of a brand new guild"""
+    from datetime import datetime
+    return {
+        "guild_name": "The Unnamed Guild",
+        "guild_description": "A brave band of adventurers",
+        "members": {},
+        "quests": {},
+        "resources": {
+            "gold": 0,
+            "items": {}
+        },
+        "announcements": [],
+        "last_updated": datetime.now().isoformat()
+    }
+
+
+def apply_change(data: Dict[str, Any], change: Dict[str, Any]):
+    """Apply a single change record to guild data
+
+    A change record is a small dict with an "op" and a "path" into the data:
+      set  - store "value" at path
+      del  - remove the key at path (if present)
+      incr - add "delta" to the number at path (creating missing mappings on the
+             way); with "prune", drop it when <= 0
+      push - insert "value" at the front of the list at path, keeping "keep" entries
+      merge - store every key/value of the "value" dict in the mapping at path
+
+    Members and quests stored in an in-memory collection become records
+    (see guild_model); the change itself keeps the plain dict.
+    """
+    *parents, key = change["path"]
+    op = change["op"]
+    container = data
+    for part in parents:
+        container = container.setdefault(part, {}) if op == "incr" else container[part]
+
+    if op == "set":
+        value = change["value"]
+        if len(parents) == 1 and isinstance(container, dict):
+            value = to_record(parents[0], value)
+        container[key] = value
+    elif op == "del":
+        container.pop(key, None)
+    elif op == "incr":
+        container[key] = container.get(key, 0) + change["delta"]
+        if change.get("prune") and container[key] <= 0:
+            del container[key]
+    elif op == "push":
+        entries = container[key]
+        entries.insert(0, change["value"])
+        if change.get("keep") is not None:
+            del entries[change["keep"]:]
+    elif op == "merge":
+        if isinstance(container[key], dict):
+            container[key].update((name, to_record(key, value)) for name, value in change["value"].items())
+        else:
+            container[key].update(change["value"])
+    else:
+        raise ValueError(f"Unknown change operation: {op}")
+
+
+def plain_data(value):
+    """Return a copy of guild data made only of plain dicts and lists
+
+    Backends such as SQLite hand out dict-like views rather than dicts; this
+    turns them into something any other backend (or json) can write.
+    """
+    if isinstance(value, Record):
+        return value.to_dict(plain_data)
+    if isinstance(value, Mapping):
+        return {key: plain_data(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain_data(item) for item in value]
+    return value
+
+
+# Snapshot formats for the single-file backend. "binary" is a pickle of the
+# guild behind a magic header, format version and CRC32 of the payload.
+SNAPSHOT_FORMATS = ["pretty", "compact", "binary"]
+BINARY_MAGIC = b"GUILDBIN"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct(">BIQ")  # version, crc32, payload length
+
+
+def _load_pickle(payload: bytes):
+    """Unpickle a snapshot payload, rebuilding only plain containers, never arbitrary objects"""
+    import pickle
+
+    class SnapshotUnpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            raise ValueError(f"Unexpected object in snapshot: {module}.{name}")
+
+    try:
+        return SnapshotUnpickler(io.BytesIO(payload)).load()
+    except pickle.UnpicklingError as e:
+        raise ValueError(f"Corrupt snapshot: {e}")
+
+
+def dump_binary(value, f):
+    """Write plain containers (dicts, lists, tuples, strings, numbers) as a binary snapshot"""
+    import pickle
+    payload = pickle.dumps(value, protocol=4)
+    f.write(BINARY_MAGIC)
+    f.write(_BINARY_HEADER.pack(BINARY_VERSION, zlib.crc32(payload), len(payload)))
+    f.write(payload)
+
+
+def dump_snapshot(data: Dict[str, Any], f, snapshot_format: str = "pretty"):
+    """Write guild data to a binary file object in the given format"""
+    with phase("serialize"):
+        if snapshot_format == "binary":
+            # Snapshots hold plain containers only, never guild_model records
+            dump_binary(plain_data(data), f)
+        elif snapshot_format == "compact":
+            f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                               default=json_default).encode('utf-8'))
+        elif snapshot_format == "pretty":
+            f.write(json.dumps(data, indent=2, ensure_ascii=False, default=json_default).encode('utf-8'))
+        else:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+
+
+# Bytes read at a time when loading a JSON snapshot
+_READ_CHUNK = 1 << 20
+
+
+def _read_rest(f) -> bytearray:
+    """The rest of a file object, read in chunks into one buffer"""
+    text = bytearray()
+    for chunk in iter(functools.partial(f.read, _READ_CHUNK), b""):
+        text += chunk
+    return text
+
+
+def load_snapshot(f):
+    """Read guild data from a binary file object, detecting its format
+
+    Returns the data and the detected format. The format is told from a
+    peek at the first bytes, and JSON is read in chunks into one buffer:
+    f.read() would hold the whole file twice over while it joins what was
+    peeked (or decompressed so far) to the rest.
+    """
+    if not hasattr(f, "peek"):
+        # Wrapped only for the peek; detached so closing the wrapper leaves f open
+        buffered = io.BufferedReader(f)
+        try:
+            return load_snapshot(buffered)
+        finally:
+            buffered.detach()
+    head = f.peek(len(BINARY_MAGIC))[:len(BINARY_MAGIC)]
+    if head != BINARY_MAGIC:
+        # Pretty-printed JSON always breaks the line after the opening brace
+        detected_format = "pretty" if head.startswith(b"{\n") else "compact"
+        return json.loads(_read_rest(f)), detected_format
+
+    f.read(len(BINARY_MAGIC))
+    header = f.read(_BINARY_HEADER.size)
+    if len(header) != _BINARY_HEADER.size:
+        raise ValueError("Truncated snapshot header")
+    version, checksum, length = _BINARY_HEADER.unpack(header)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {version}")
+    payload = f.read(length)
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        raise ValueError("Snapshot checksum mismatch")
+    return _load_pickle(payload), "binary"
+
+
+# Compression of the single-file snapshot. Compressed files are recognised by
+# their magic bytes, new files by their extension (.gz / .xz).
+COMPRESSIONS = ["none", "gzip", "xz"]
+_COMPRESSION_MAGIC = [(b"\x1f\x8b", "gzip"), (b"\xfd7zXZ\x00", "xz")]
+_COMPRESSION_EXTENSIONS = {".gz": "gzip", ".xz": "xz"}
+
+
+def detect_compression(path: str) -> str:
+    """Return the compression of an existing file, or the one its name suggests"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(6)
+    except FileNotFoundError:
+        return _COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "none")
+    for magic, compression in _COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return "none"
+
+
+def open_compressed(path: str, mode: str, compression: str = "none", level: int = None):
+    """Open a file in binary mode, (de)compressing it on the fly
+
+    Reads stream through the decompressor chunk by chunk, so the compressed
+    file is never held in memory alongside the decompressed data.
+    """
+    if compression == "gzip":
+        import gzip
+        return gzip.open(path, mode, compresslevel=6 if level is None else level)
+    if compression == "xz":
+        import lzma
+        if 'r' in mode:
+            return lzma.open(path, mode)
+        return lzma.open(path, mode, preset=6 if level is None else level)
+    return open(path, mode)
+
+
+# Durability levels for saves. Both replace files atomically (write a temp
+# file, then rename it over the old one); "safe" also fsyncs the file and its
+# directory so a completed save survives power loss, not just a crash.
+DURABILITY_LEVELS = ["fast", "safe"]
+READ_ERRORS = (ValueError, IOError, EOFError)
+
+
+def _fsync_directory(directory: str):
+    if os.name == 'nt':
+        return  # Windows cannot open directories for fsync
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, durability: str = "safe"):
+    """Yield a temp file path that replaces ``path`` once written successfully
+
+    The previous version of ``path`` is kept as ``<path>.bak`` so a damaged
+    file can be recovered by load_with_recovery(). If writing fails, the temp
+    file is removed and ``path`` is left untouched.
+    """
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        # mkstemp creates owner-only files; keep the permissions a plain open() would give
+        os.chmod(temp_path, _file_mode(path))
+        yield temp_path
+        if durability == "safe":
+            with phase("fsync"):
+                fd = os.open(temp_path, os.O_RDWR)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        if os.path.exists(path):
+            _keep_backup(path)
+        os.replace(temp_path, path)
+        if durability == "safe":
+            with phase("fsync"):
+                _fsync_directory(directory)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _file_mode(path: str) -> int:
+    """Permissions for a new version of path: those of the existing file, else the umask default"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _keep_backup(path: str):
+    """Make ``<path>.bak`` a copy of path while path stays in place for readers"""
+    backup_temp = path + ".bak.tmp"
+    if os.path.exists(backup_temp):
+        os.remove(backup_temp)
+    try:
+        os.link(path, backup_temp)
+    except OSError:
+        import shutil
+        shutil.copy2(path, backup_temp)  # no hard links on this file system
+    os.replace(backup_temp, path + ".bak")
+
+
+def load_with_recovery(path: str, read):
+    """Read a data file, falling back to the copy kept by the previous save
+
+    ``read`` is called with the path to try. Returns None when there is no
+    file at all. A file that cannot be read and has no good backup is moved to
+    ``<path>.corrupt`` rather than being overwritten by the next save.
+    """
+    for candidate in (path, path + ".bak"):
+        if not os.path.exists(candidate):
+            continue
+        try:
+            result = read(candidate)
+        except READ_ERRORS:
+            print(f"Warning: Could not load {candidate}.")
+            continue
+        if candidate != path:
+            print(f"[+] Recovered {path} from the last good copy ({candidate})")
+        return result
+
+    if os.path.exists(path):
+        os.replace(path, path + ".corrupt")
+        print(f"Warning: Moved unreadable {path} to {path}.corrupt. Starting with empty data.")
+    return None
+
+
+class FileLock:
+    """Exclusive advisory lock on ``<data_file>.lock``
+
+    Writers hold the lock only while checking the guild version and saving.
+    The lock file also records the version of the last save, so a writer can
+    tell cheaply whether another process saved since it loaded the guild.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 seconds; keep waiting
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def read_version(self) -> int:
+        """Return the version recorded by the last save (0 if none)"""
+        self._file.seek(0)
+        try:
+            return int(self._file.read().strip() or 0)
+        except ValueError:
+            return 0
+
+    def peek_version(self) -> int:
+        """Return the version recorded by the last save without taking the lock"""
+        try:
+            with open(self.path, 'rb') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_version(self, version: int):
+        """Record the version that was just saved"""
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(version).encode('ascii'))
+        self._file.flush()
+
+
+class Storage:
+    """Base class for storage backends
+
+    Backends provide load(), save(data, changes), compact(data) and
+    replace(data). File backends rely on GuildManager's lock file to keep
+    concurrent writers apart; a ``transactional`` backend serialises writers
+    itself and is told through begin() when a batch of changes starts.
+    """
+
+    backend = None
+    transactional = False
+
+    def begin(self):
+        """Called before the first change that the next save will persist"""
+
+    def saved_files(self) -> List[str]:
+        """The files holding the guild as last saved, for history snapshots"""
+        return [self.data_file]
+
+
+class JsonStorage(Storage):
+    """Stores the guild as a single JSON snapshot, optionally with a journal
+
+    In journal mode each save appends the pending change records to
+    ``<data_file>.journal`` instead of rewriting the snapshot, so the cost of a
+    save depends on the size of the change rather than the size of the guild.
+    Once the journal holds more than ``compact_after`` records it is folded back
+    into the snapshot.
+
+    The snapshot is written in ``snapshot_format`` (see SNAPSHOT_FORMATS) and
+    compressed with ``compression`` (see COMPRESSIONS) at ``compress_level``;
+    when not given, an existing snapshot keeps the format and compression it
+    was found in. Snapshots are replaced atomically at the given durability
+    (see DURABILITY_LEVELS), and in "safe" mode journal appends are fsynced.
+    """
+
+    backend = "json"
+
+    def __init__(self, data_file: str, journal: bool = False, compact_after: int = 1000,
+                 snapshot_format: str = None, compression: str = None, compress_level: int = None,
+                 durability: str = "safe"):
+        self.data_file = data_file
+        self.durability = durability
+        self.snapshot_format = snapshot_format
+        self.compression = compression
+        self.compress_level = compress_level
+        self.journal_file = data_file + ".journal"
+        self.journal = journal
+        self.compact_after = compact_after
+        self.journal_seq = 0
+        self.journal_records = 0
+
+    def load(self) -> Dict[str, Any]:
+        """Load the snapshot and replay any journaled changes on top of it"""
+        if self.compression is None:
+            self.compression = detect_compression(self.data_file)
+        snapshot = load_with_recovery(self.data_file, self._read_snapshot)
+        if snapshot is None:
+            data = default_guild_data()
+        else:
+            data, detected_format = snapshot
+            if self.snapshot_format is None:
+                self.snapshot_format = detected_format
+
+        self.journal_seq = data.pop("journal_seq", 0)
+        self.journal_records = 0
+        if os.path.exists(self.journal_file):
+            self._replay_journal(data)
+        return compact_guild(data)
+
+    @staticmethod
+    def _read_snapshot(path: str):
+        with open_compressed(path, 'rb', detect_compression(path)) as f:
+            return load_snapshot(f)
+
+    def _replay_journal(self, data: Dict[str, Any]):
+        """Apply journal records newer than the snapshot"""
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-append leaves a torn final record; everything
+                    # before it is intact, so stop replaying here.
+                    print(f"Warning: Ignoring incomplete record at line {line_number} of {self.journal_file}.")
+                    break
+                self.journal_records += 1
+                # Records already folded into the snapshot (e.g. a compaction
+                # that crashed before truncating the journal) are skipped.
+                if record["seq"] <= self.journal_seq:
+                    continue
+                apply_change(data, record)
+                self.journal_seq = record["seq"]
+
+    def save(self, data: Dict[str, Any], changes: List[Dict[str, Any]]):
+        """Persist pending changes to disk"""
+        # A change set bigger than the journal limit is cheaper as a snapshot
+        if self.journal and 0 < len(changes) <= self.compact_after and os.path.exists(self.data_file):
+            self._append_journal(changes)
+            if self.journal_records > self.compact_after:
+                self.compact(data)
+        else:
+            self._write_snapshot(data)
+
+    def compact(self, data: Dict[str, Any]):
+        """Fold the journal back into the snapshot"""
+        self._write_snapshot(data)
+
+    def replace(self, data: Dict[str, Any]):
+        """Overwrite the stored guild with the given guild data"""
+        self._write_snapshot(plain_data(data))
+
+    def saved_files(self) -> List[str]:
+        """The snapshot and, if there is one, the journal"""
+        if os.path.exists(self.journal_file):
+            return [self.data_file, self.journal_file]
+        return [self.data_file]
+
+    def retire(self, backup_file: str):
+        """Move the data file aside once another backend has taken it over"""
+        os.replace(self.data_file, backup_file)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def _append_journal(self, changes: List[Dict[str, Any]]):
+        lines = []
+        with phase("serialize"):
+            for change in changes:
+                self.journal_seq += 1
+                record = dict(change, seq=self.journal_seq)
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=json_default))
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+            if self.durability == "safe":
+                f.flush()
+                with phase("fsync"):
+                    os.fsync(f.fileno())
+        self.journal_records += len(lines)
+
+    def _write_snapshot(self, data: Dict[str, Any]):
+        snapshot = dict(data, journal_seq=self.journal_seq) if self.journal else data
+        compression = self.compression or detect_compression(self.data_file)
+        with atomic_write(self.data_file, self.durability) as temp_file:
+            with open_compressed(temp_file, 'wb', compression, self.compress_level) as f:
+                dump_snapshot(snapshot, f, self.snapshot_format or "pretty")
+        # The snapshot now contains everything the journal did
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_records = 0
+
+
+# Per-collection files used by SplitStorage; every other top-level key
+# (guild name, description, timestamps) lives in the "meta" file.
+COLLECTIONS = ["members", "quests", "resources", "announcements"]
+
+
+def collection_of(path: List[str]) -> str:
+    """Return the name of the collection a change path belongs to"""
+    return path[0] if path[0] in COLLECTIONS else "meta"
+
+
+class LazyGuildData(MutableMapping):
+    """Guild data whose collections are only read from disk when first used
+
+    Each loader is a callable returning one section; it runs the first time
+    that key is looked up, so posting an announcement never parses members.
+    """
+
+    def __init__(self, data: Dict[str, Any], loaders: Dict[str, Any]):
+        self._data = data
+        self._loaders = loaders
+
+    def __getitem__(self, key):
+        if key in self._loaders:
+            with phase("load"):
+                self._data[key] = self._loaders.pop(key)()
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._loaders.pop(key, None)
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        if self._loaders.pop(key, None) is None:
+            del self._data[key]
+        else:
+            self._data.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._loaders or key in self._data
+
+    def __iter__(self):
+        yield from self._data
+        yield from (key for key in self._loaders if key not in self._data)
+
+    def __len__(self):
+        return len(self._data) + sum(1 for key in self._loaders if key not in self._data)
+
+    def is_loaded(self, key: str) -> bool:
+        """Return True if the section has been read from disk (or replaced)"""
+        return key not in self._loaders
+
+
+def meta_of(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the top-level guild fields that are not collections"""
+    # Indexing key by key keeps lazily loaded collections untouched
+    return {key: data[key] for key in data if key not in COLLECTIONS}
+
+
+def _read_json_file(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_json_section(path: str, default):
+    section = load_with_recovery(path, _read_json_file)
+    return default if section is None else section
+
+
+def _has_magic(path: str, magic: bytes) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+
+class SplitStorage(Storage):
+    """Stores each collection of the guild in its own file
+
+    The files live in ``<data_file>.d/``; collections are read lazily and only
+    the ones touched by pending changes are rewritten on save, so adjusting
+    gold neither reads nor rewrites the members file. A single-file guild found
+    at ``data_file`` is migrated on the first save and kept as
+    ``<data_file>.migrated``. Each file is replaced atomically at the given
+    durability, keeping its previous version as a ``.bak`` for recovery.
+    """
+
+    backend = "split"
+
+    def __init__(self, data_file: str, durability: str = "safe"):
+        self.data_file = data_file
+        self.data_dir = data_file + ".d"
+        self.durability = durability
+        self._migrating = False
+
+    def _collection_file(self, name: str) -> str:
+        return os.path.join(self.data_dir, name + ".json")
+
+    def load(self) -> Dict[str, Any]:
+        """Load guild meta now and each collection file on first use"""
+        if not os.path.isdir(self.data_dir):
+            # Fresh install or a single-file guild: load it with its own
+            # backend and write out every collection on the next save.
+            self._migrating = os.path.exists(self.data_file)
+            return open_storage(self.data_file).load()
+
+        data = default_guild_data()
+        data.update(_read_json_section(self._collection_file("meta"), {}))
+
+        loaders = {}
+        for name in COLLECTIONS:
+            path = self._collection_file(name)
+            if os.path.exists(path) or os.path.exists(path + ".bak"):
+                loaders[name] = functools.partial(self._read_collection, name, path, data[name])
+        return LazyGuildData(data, loaders)
+
+    @staticmethod
+    def _read_collection(name: str, path: str, default):
+        return compact_collection(name, _read_json_section(path, default))
+
+    def save(self, data: Dict[str, Any], changes: List[Dict[str, Any]]):
+        """Rewrite only the collections that have pending changes"""
+        if self._migrating or not os.path.isdir(self.data_dir):
+            self.compact(data)
+            return
+        dirty = {collection_of(change["path"]) for change in changes}
+        for name in COLLECTIONS + ["meta"]:
+            if name in dirty:
+                self._write_collection(data, name)
+
+    def compact(self, data: Dict[str, Any]):
+        """Rewrite every collection file"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        for name in COLLECTIONS + ["meta"]:
+            self._write_collection(data, name)
+        if self._migrating:
+            JsonStorage(self.data_file).retire(self.data_file + ".migrated")
+            print(f"[+] Migrated {self.data_file} to per-collection files in {self.data_dir}")
+            self._migrating = False
+
+    def replace(self, data: Dict[str, Any]):
+        """Overwrite the stored guild with the given guild data"""
+        self.compact(plain_data(data))
+
+    def saved_files(self) -> List[str]:
+        """Every collection file"""
+        return [path for path in map(self._collection_file, COLLECTIONS + ["meta"]) if os.path.exists(path)]
+
+    def _write_collection(self, data: Dict[str, Any], name: str):
+        section = meta_of(data) if name == "meta" else data[name]
+        with atomic_write(self._collection_file(name), self.durability) as temp_file:
+            with open(temp_file, 'w', encoding='utf-8') as f, phase("serialize"):
+                json.dump(section, f, indent=2, ensure_ascii=False, default=json_default)
+
+
+# Sections container: the magic line, a one-line JSON header mapping each
+# section to its [offset, length] after the header, then the sections as
+# compact JSON, one after the other.
+SECTIONS_MAGIC = b"GUILDSEC1\n"
+
+
+class SectionsStorage(Storage):
+    """Stores the guild in one file whose sections can be read independently
+
+    The header's offset table lets load() parse just the guild meta and leave
+    every collection until it is first used, so the cost of a command follows
+    the sections it touches. On save, sections without pending changes are
+    copied across byte for byte instead of being parsed and re-serialized.
+    The file is replaced atomically at the given durability.
+
+    On POSIX systems the file stays open after load(), so collections read
+    later come from the same version of the guild even if another process
+    has saved a newer one in the meantime.
+    """
+
+    backend = "sections"
+
+    def __init__(self, data_file: str, durability: str = "safe"):
+        self.data_file = data_file
+        self.durability = durability
+        self._source = data_file
+        self._handle = None
+        self._offsets = None
+        self._base = 0
+
+    def load(self) -> Dict[str, Any]:
+        """Read the header and guild meta; collections load on first use"""
+        self._close()
+        self._offsets = None
+        if detect_backend(self.data_file) != "sections" and os.path.isfile(self.data_file):
+            # A plain JSON guild; it is rewritten as sections on save
+            return JsonStorage(self.data_file).load()
+
+        container = load_with_recovery(self.data_file, self._read_header)
+        if container is None:
+            return default_guild_data()
+        self._source, self._offsets, self._base, meta, handle = container
+        if os.name != 'nt':
+            # The header was read through this handle, so the sections read
+            # later are guaranteed to come from the same file
+            self._handle = handle
+        else:
+            handle.close()  # Windows cannot replace a file that is open elsewhere
+
+        data = default_guild_data()
+        data.update(meta)
+        loaders = {name: functools.partial(self._read_section, name)
+                   for name in COLLECTIONS if name in self._offsets}
+        return LazyGuildData(data, loaders)
+
+    def save(self, data: Dict[str, Any], changes: List[Dict[str, Any]]):
+        """Rewrite the file, re-serializing only sections with pending changes"""
+        self._write(data, {collection_of(change["path"]) for change in changes})
+
+    def compact(self, data: Dict[str, Any]):
+        """Re-serialize every section"""
+        self._write(data, set(COLLECTIONS + ["meta"]))
+
+    def replace(self, data: Dict[str, Any]):
+        """Overwrite the stored guild with the given guild data"""
+        self._offsets = None
+        self._write(plain_data(data), set(COLLECTIONS + ["meta"]))
+
+    def _read_header(self, path: str):
+        """Return the file's offset table, where its sections start, its meta and the open file"""
+        f = open(path, 'rb')
+        try:
+            if f.read(len(SECTIONS_MAGIC)) != SECTIONS_MAGIC:
+                raise ValueError(f"{path} is not a sections file")
+            offsets = json.loads(f.readline())["sections"]
+            base = f.tell()
+            f.seek(base + offsets["meta"][0])
+            meta = json.loads(f.read(offsets["meta"][1]).decode('utf-8'))
+        except BaseException:
+            f.close()
+            raise
+        return path, offsets, base, meta, f
+
+    def _read_raw(self, name: str) -> bytes:
+        offset, length = self._offsets[name]
+        handle = self._handle or open(self._source, 'rb')
+        try:
+            handle.seek(self._base + offset)
+            return handle.read(length)
+        finally:
+            if handle is not self._handle:
+                handle.close()
+
+    def _close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _read_section(self, name: str):
+        return compact_collection(name, json.loads(self._read_raw(name).decode('utf-8')))
+
+    def _write(self, data: Dict[str, Any], dirty):
+        blobs = []
+        for name in COLLECTIONS + ["meta"]:
+            if self._offsets and name in self._offsets and name not in dirty and name != "meta":
+                blob = self._read_raw(name)
+            else:
+                section = meta_of(data) if name == "meta" else data[name]
+                with phase("serialize"):
+                    blob = json.dumps(section, ensure_ascii=False, separators=(',', ':'),
+                                      default=json_default).encode('utf-8')
+            blobs.append((name, blob))
+
+        offsets = {}
+        position = 0
+        for name, blob in blobs:
+            offsets[name] = [position, len(blob)]
+            position += len(blob)
+        header = json.dumps({"sections": offsets}).encode('utf-8') + b"\n"
+
+        with atomic_write(self.data_file, self.durability) as temp_file:
+            with open(temp_file, 'wb') as f:
+                f.write(SECTIONS_MAGIC)
+                f.write(header)
+                for _, blob in blobs:
+                    f.write(blob)
+        self._close()
+        self._source = self.data_file
+        self._offsets = offsets
+        self._base = len(SECTIONS_MAGIC) + len(header)
+        if os.name != 'nt':
+            self._handle = open(self._source, 'rb')
+
+
+BACKENDS = ["json", "split", "sections", "sqlite"]
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def detect_backend(data_file: str) -> str:
+    """Guess the storage backend from the data file name and what is on disk"""
+    if data_file.lower().endswith(SQLITE_EXTENSIONS):
+        return "sqlite"
+    if os.path.isdir(data_file + ".d"):
+        return "split"
+    # The backup counts too, so a damaged data file is still recovered by
+    # the backend that wrote it
+    for candidate in (data_file, data_file + ".bak"):
+        if os.path.isfile(candidate) and _has_magic(candidate, SECTIONS_MAGIC):
+            return "sections"
+    return "json"
+
+
+def open_storage(data_file: str, backend: str = None, journal: bool = False, compact_after: int = 1000,
+                 snapshot_format: str = None, compression: str = None, compress_level: int = None,
+                 durability: str = "safe"):
+    """Create the storage backend for a data file
+
+    When no backend is given it is detected from what is already on disk,
+    so a guild keeps using the layout it was created with.
+    """
+    if backend is None:
+        backend = detect_backend(data_file)
+
+    if backend == "json":
+        return JsonStorage(data_file, journal=journal, compact_after=compact_after,
+                           snapshot_format=snapshot_format, compression=compression,
+                           compress_level=compress_level, durability=durability)
+    if backend == "split":
+        return SplitStorage(data_file, durability=durability)
+    if backend == "sections":
+        return SectionsStorage(data_file, durability=durability)
+    if backend == "sqlite":
+        from guild_sqlite import SqliteStorage
+        return SqliteStorage(data_file, durability=durability)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,78 @@
+"""
+Timing instrumentation for the Fantasy Guild Manager
+Measures where a command spends its time and reports it as one JSON line
+"""
+
+import contextlib
+import json
+import sys
+import time
+
+# The Timings being recorded, if any. Code that wants to be measured wraps
+# itself in phase(), which costs next to nothing while nothing is recorded.
+_active = None
+
+
+class Timings:
+    """Time spent per phase while running one command
+
+    Phases accumulate (every save in a batch adds to "save") and may nest:
+    "save" includes the "serialize" and "fsync" inside it.
+    """
+
+    def __init__(self, command: str, start: float = None):
+        self.command = command
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {}
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record(self, total: bool = True, **fields) -> dict:
+        """The timing record: when, which command, total and per-phase milliseconds, plus fields"""
+        from datetime import datetime
+        record = {"time": datetime.now().isoformat(), "command": self.command}
+        record.update(fields)
+        if total:
+            record["total_ms"] = round((time.perf_counter() - self.start) * 1000, 3)
+        record["phases"] = {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+        return record
+
+
+def start(command: str, started: float = None) -> Timings:
+    """Start recording phases for a command"""
+    global _active
+    _active = Timings(command, started)
+    return _active
+
+
+def stop() -> Timings:
+    """Stop recording and return what was recorded"""
+    global _active
+    timings, _active = _active, None
+    return timings
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """Count the time spent in the block towards the named phase"""
+    timings = _active
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def emit(record: dict, metrics_file: str = None):
+    """Write a timing record as one JSON line to stderr, or append it to a metrics file"""
+    line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n"
+    if metrics_file:
+        # One write per record, so lines from concurrent commands don't interleave
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            f.write(line)
+    else:
+        sys.stderr.write(line)
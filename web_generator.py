@@ -3,13 +3,64 @@ Web page generator for the Fantasy Guild Manager
 Creates beautiful HTML pages that party members can view
 """
 
+import itertools
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Dict, Iterator
 
-def generate_guild_webpage(guild_data: Dict[str, Any], output_file: str):
-    """Generate a beautiful HTML webpage from guild data"""
-    
-    html_content = f"""<!DOCTYPE html>
+from guild_timing import phase
+
+# Pieces of the page joined into one write
+WRITE_PIECES = 1000
+
+
+def generate_guild_webpage(guild_data: Dict[str, Any], output_file: str, archived_quests=()):
+    """Generate a beautiful HTML webpage from guild data, listing archived quests as completed ones
+
+    The page is streamed: render_guild_webpage() yields it piece by piece
+    and the pieces are written a thousand at a time, so it is never held in
+    memory as a whole and the time taken grows linearly with the roster.
+    """
+    pieces = render_guild_webpage(guild_data, archived_quests)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        while True:
+            chunk = list(itertools.islice(pieces, WRITE_PIECES))
+            if not chunk:
+                break
+            f.write("".join(chunk))
+
+def render_guild_webpage(guild_data: Dict[str, Any], archived_quests=()) -> Iterator[str]:
+    """Yield the HTML of the guild webpage in pieces, a record at a time
+
+    Each section's phase also counts the time spent writing its pieces out.
+    """
+    with phase("render.page"):
+        yield page_start(guild_data)
+    sections = [
+        ("render.announcements", generate_announcements_section(guild_data.get('announcements', []))),
+        ("render.members", generate_members_section(guild_data.get('members', {}))),
+        ("render.quests", generate_quests_section(guild_data.get('quests', {}), archived_quests)),
+        ("render.resources", generate_resources_section(guild_data.get('resources', {}))),
+    ]
+    for position, (name, section) in enumerate(sections):
+        with phase(name):
+            if position:
+                yield "\n            "
+            yield from section
+    with phase("render.page"):
+        yield f"""
+        </div>
+        
+        <div class="footer">
+            <p>Last updated: {format_datetime(guild_data.get('last_updated', ''))}</p>
+            <p>Generated by Fantasy Guild Manager CLI</p>
+        </div>
+    </div>
+</body>
+</html>"""
+
+def page_start(guild_data: Dict[str, Any]) -> str:
+    """The page up to its first section: head, styles and the guild's banner"""
+    return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -241,104 +292,85 @@ def generate_guild_webpage(guild_data: Dict[str, Any], output_file: str):
         </div>
         
         <div class="content">
-            {generate_announcements_section(guild_data.get('announcements', []))}
-            {generate_members_section(guild_data.get('members', {}))}
-            {generate_quests_section(guild_data.get('quests', {}))}
-            {generate_resources_section(guild_data.get('resources', {}))}
-        </div>
-        
-        <div class="footer">
-            <p>Last updated: {format_datetime(guild_data.get('last_updated', ''))}</p>
-            <p>Generated by Fantasy Guild Manager CLI</p>
-        </div>
-    </div>
-</body>
-</html>"""
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+            """
 
-def generate_announcements_section(announcements):
-    """Generate the announcements section"""
+def generate_announcements_section(announcements) -> Iterator[str]:
+    """Yield the announcements section"""
     if not announcements:
-        return """
+        yield """
         <div class="section">
             <h2>Guild Announcements</h2>
             <p>No announcements at this time.</p>
         </div>"""
+        return
     
-    announcements_html = ""
+    yield """
+    <div class="section">
+        <h2>Guild Announcements</h2>
+        """
     for announcement in announcements:
         date_str = format_datetime(announcement.get('date', ''))
-        announcements_html += f"""
+        yield f"""
         <div class="announcement">
             <div class="announcement-date">{date_str}</div>
             <div class="announcement-message">{announcement['message']}</div>
         </div>"""
-    
-    return f"""
-    <div class="section">
-        <h2>Guild Announcements</h2>
-        {announcements_html}
+    yield """
     </div>"""
 
-def generate_members_section(members):
-    """Generate the guild members section"""
+def generate_members_section(members) -> Iterator[str]:
+    """Yield the guild members section, one member at a time"""
     if not members:
-        return """
+        yield """
         <div class="section">
             <h2>Guild Members</h2>
             <p>No guild members yet. The adventure awaits!</p>
         </div>"""
+        return
     
-    members_html = ""
+    yield """
+    <div class="section">
+        <h2>Guild Members</h2>
+        <div class="member-list">
+            """
     for member in members.values():
         status = "Active" if member.get('status') == 'active' else "Inactive"
         
         description = f'<div class="member-description">{member.get("description", "")}</div>' if member.get("description") else ""
         
-        members_html += f"""
+        yield f"""
         <div class="member-item">
             <div class="member-name">{member['name']} ({status})</div>
             <div class="member-class">Level {member.get('level', 1)} {member.get('class', 'Adventurer')}</div>
             {description}
         </div>"""
-    
-    return f"""
-    <div class="section">
-        <h2>Guild Members</h2>
-        <div class="member-list">
-            {members_html}
+    yield """
         </div>
     </div>"""
 
-def generate_quests_section(quests):
-    """Generate the quests section"""
-    if not quests:
-        return """
+def generate_quests_section(quests, archived_quests=()) -> Iterator[str]:
+    """Yield the quests section: available quests, then completed and archived ones"""
+    if not quests and not archived_quests:
+        yield """
         <div class="section">
             <h2>Guild Quests</h2>
             <p>No quests available. Check back later for new adventures!</p>
         </div>"""
+        return
     
-    # Separate available and completed quests
-    available_quests = []
-    completed_quests = []
+    yield """
+    <div class="section">
+        <h2>Guild Quests</h2>
+        """
     
+    # Available quests first; two passes over the quests rather than copying them into lists
     for quest in quests.values():
         if quest.get('status') == 'completed':
-            completed_quests.append(quest)
-        else:
-            available_quests.append(quest)
-    
-    quests_html = ""
-    
-    # Available quests first
-    for quest in available_quests:
+            continue
         difficulty_class = f"difficulty-{quest.get('difficulty', 'normal').lower()}"
         reward_html = f'<div class="quest-reward">Reward: {quest["reward"]}</div>' if quest.get("reward") else ""
         
-        quests_html += f"""
+        yield f"""
         <div class="quest-item">
             <div class="quest-title">{quest['title']}</div>
             <span class="quest-difficulty {difficulty_class}">{quest.get('difficulty', 'Normal')}</span>
@@ -347,11 +379,12 @@ def generate_quests_section(quests):
         </div>"""
     
     # Completed quests
-    for quest in completed_quests:
+    completed_quests = (quest for quest in quests.values() if quest.get('status') == 'completed')
+    for quest in itertools.chain(completed_quests, archived_quests):
         difficulty_class = f"difficulty-{quest.get('difficulty', 'normal').lower()}"
         reward_html = f'<div class="quest-reward">Reward: {quest["reward"]}</div>' if quest.get("reward") else ""
         
-        quests_html += f"""
+        yield f"""
         <div class="quest-item completed">
             <div class="quest-title">{quest['title']} (Completed)</div>
             <span class="quest-difficulty {difficulty_class}">{quest.get('difficulty', 'Normal')}</span>
@@ -359,34 +392,30 @@ def generate_quests_section(quests):
             {reward_html}
         </div>"""
     
-    return f"""
-    <div class="section">
-        <h2>Guild Quests</h2>
-        {quests_html}
+    yield """
     </div>"""
 
-def generate_resources_section(resources):
-    """Generate the resources section"""
-    resources_html = f"""
+def generate_resources_section(resources) -> Iterator[str]:
+    """Yield the resources section"""
+    yield f"""
+    <div class="section">
+        <h2>Guild Resources</h2>
+        <div class="resource-list">
+            
     <div class="resource-item">
         <div class="resource-name">Gold</div>
         <div class="resource-value">{resources.get('gold', 0)}</div>
     </div>"""
     
     items = resources.get('items', {})
-    if items:
-        for item_name, quantity in items.items():
-            resources_html += f"""
+    for item_name, quantity in items.items():
+        yield f"""
             <div class="resource-item">
                 <div class="resource-name">{item_name}</div>
                 <div class="resource-value">{quantity}</div>
             </div>"""
     
-    return f"""
-    <div class="section">
-        <h2>Guild Resources</h2>
-        <div class="resource-list">
-            {resources_html}
+    yield """
         </div>
     </div>"""
 